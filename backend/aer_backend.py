@@ -1,155 +1,653 @@
 # aer_backend.py
+import concurrent.futures
+import copy
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
 import qiskit
 import qiskit_aer
+from qiskit.circuit import CircuitInstruction, ClassicalRegister, Parameter
+from qiskit.circuit.library.standard_gates import (
+    HGate, XGate, YGate, ZGate, SGate, SdgGate, TGate, TdgGate,
+    RXGate, RYGate, RZGate, PhaseGate, UGate,
+    CXGate, CYGate, CZGate, SwapGate, CRXGate, CRYGate, CRZGate, CUGate, CCXGate,
+)
 
 # pip install qiskit qiskit-aer
 
-def _build_qiskit_circuit_aer(circuit_data: dict) -> tuple[qiskit.QuantumCircuit, bool]:
-    """
-    Builds a Qiskit QuantumCircuit from the standardized circuit data.
-    Returns the circuit and a boolean indicating if explicit measurement gates were found.
-    """
-    num_qubits = circuit_data["qubits"]
-    # Create classical bits equal to the number of quantum bits for potential measurements
-    circuit = qiskit.QuantumCircuit(num_qubits, num_qubits)
+_NO_CLBITS = ()
 
-    has_explicit_measurements = False
+# Parameter-free gates are immutable, so one instance of each is shared by every circuit.
+_H, _X, _Y, _Z = HGate(), XGate(), YGate(), ZGate()
+_S, _SDG, _T, _TDG = SGate(), SdgGate(), TGate(), TdgGate()
+_CX, _CY, _CZ, _SWAP, _CCX = CXGate(), CYGate(), CZGate(), SwapGate(), CCXGate()
+
+# Integer ids for every supported gate. Gates are normalized into these ids once,
+# so the build loop never compares strings.
+_GATE_NAMES = (
+    "h", "x", "y", "z", "s", "sdg", "t", "tdg", "rx", "ry", "rz", "p", "u", # Single qubit gates
+    "cx", "cy", "cz", "swap", "crx", "cry", "crz", "cu", # Two qubit gates
+    "ccx", # Three-qubit gates
+    "measure",
+)
+_GATE_IDS = {name: gate_id for gate_id, name in enumerate(_GATE_NAMES)}
+_MEASURE_ID = _GATE_IDS["measure"]
+_TWO_QUBIT_IDS = frozenset(_GATE_IDS[name] for name in ("cx", "cy", "cz", "swap", "crx", "cry", "crz", "cu"))
+_CCX_ID = _GATE_IDS["ccx"]
+_U_ID = _GATE_IDS["u"]
+_SINGLE_QUBIT_IDS = frozenset(range(_U_ID + 1))
+# Clifford gates that Aer's stabilizer method can simulate directly
+_CLIFFORD_IDS = frozenset(_GATE_IDS[name] for name in ("h", "x", "y", "z", "s", "sdg", "cx", "cy", "cz", "swap", "measure"))
+# Rotations are Clifford only when the angle is a multiple of pi/2
+_ROTATION_IDS = frozenset(_GATE_IDS[name] for name in ("rx", "ry", "rz"))
+
+# A normalized gate is a fixed-shape tuple:
+#   (gate_id, target, control, control2, theta, phi, lam, gamma)
+# "control" holds control1 for ccx and the classical bit for measure; unused qubit slots are -1.
+# Builders are indexed by gate_id and return a ready-made CircuitInstruction, which is appended
+# without going through the per-gate circuit methods.
+_GATE_BUILDERS = (
+    lambda q, r: CircuitInstruction(_H, (q[r[1]],), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(_X, (q[r[1]],), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(_Y, (q[r[1]],), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(_Z, (q[r[1]],), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(_S, (q[r[1]],), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(_SDG, (q[r[1]],), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(_T, (q[r[1]],), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(_TDG, (q[r[1]],), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(RXGate(r[4]), (q[r[1]],), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(RYGate(r[4]), (q[r[1]],), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(RZGate(r[4]), (q[r[1]],), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(PhaseGate(r[4]), (q[r[1]],), _NO_CLBITS), # Phase gate
+    # U gate (generalized single qubit gate: U(theta, phi, lambda))
+    lambda q, r: CircuitInstruction(UGate(r[4], r[5], r[6]), (q[r[1]],), _NO_CLBITS),
+
+    lambda q, r: CircuitInstruction(_CX, (q[r[2]], q[r[1]]), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(_CY, (q[r[2]], q[r[1]]), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(_CZ, (q[r[2]], q[r[1]]), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(_SWAP, (q[r[2]], q[r[1]]), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(CRXGate(r[4]), (q[r[2]], q[r[1]]), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(CRYGate(r[4]), (q[r[2]], q[r[1]]), _NO_CLBITS),
+    lambda q, r: CircuitInstruction(CRZGate(r[4]), (q[r[2]], q[r[1]]), _NO_CLBITS),
+    # Controlled U gate (generalized two-qubit gate: CU(theta, phi, lambda, gamma))
+    lambda q, r: CircuitInstruction(CUGate(r[4], r[5], r[6], r[7]), (q[r[2]], q[r[1]]), _NO_CLBITS),
 
-    for gate_info in circuit_data["gates"]:
+    lambda q, r: CircuitInstruction(_CCX, (q[r[2]], q[r[3]], q[r[1]]), _NO_CLBITS), # Toffoli gate
+)
+
+def _check_qubit(value, role: str, gate_type: str, num_qubits: int) -> int:
+    # Instructions are appended without Qiskit's own argument checks, so indices must be in range here.
+    # An exact type check is used so that booleans are not accepted as qubit indices.
+    if not (type(value) is int and 0 <= value < num_qubits):
+        raise ValueError(f"Invalid {role} for {gate_type} gate: {value}. Must be an integer in [0, {num_qubits}).")
+    return value
+
+def _normalize_gates(gates: list, num_qubits: int) -> list[tuple]:
+    """
+    Validates the frontend gate dicts once and converts them into fixed-shape tuples
+    with integer gate ids and resolved parameters. Unknown gates are skipped with a warning.
+    """
+    normalized = []
+    append = normalized.append
+    gate_ids = _GATE_IDS
+    two_qubit_ids = _TWO_QUBIT_IDS
+    symbols = {} # Parameter placeholders seen so far, by name
+    for gate_info in gates:
         gate_type = gate_info["gate"].lower()
+        gate_id = gate_ids.get(gate_type)
+        if gate_id is None:
+            print(f"Warning: Unknown gate type {gate_type}. Skipping.")
+            continue
+
+        # The common cases (valid target, valid control) are checked inline; _check_qubit
+        # is only called to validate the rarer slots or to report an error.
         target = gate_info.get("target")
-        control = gate_info.get("control")
-        params = gate_info.get("params", {})
-
-        # Basic validation for target/control qubits
-        if target is not None and not isinstance(target, int):
-            raise ValueError(f"Invalid target for {gate_type} gate: {target}. Must be an integer.")
-        if control is not None and not isinstance(control, int):
-            raise ValueError(f"Invalid control for {gate_type} gate: {control}. Must be an integer.")
-        
-        # Single qubit gates
-        if gate_type == "h":
-            circuit.h(target)
-        elif gate_type == "x":
-            circuit.x(target)
-        elif gate_type == "y":
-            circuit.y(target)
-        elif gate_type == "z":
-            circuit.z(target)
-        elif gate_type == "s":
-            circuit.s(target)
-        elif gate_type == "sdg":
-            circuit.sdg(target)
-        elif gate_type == "t":
-            circuit.t(target)
-        elif gate_type == "tdg":
-            circuit.tdg(target)
-        elif gate_type == "rx":
-            circuit.rx(params.get("theta", 0), target)
-        elif gate_type == "ry":
-            circuit.ry(params.get("theta", 0), target)
-        elif gate_type == "rz":
-            circuit.rz(params.get("theta", 0), target)
-        elif gate_type == "p": # Phase gate
-            circuit.p(params.get("theta", 0), target)
-        elif gate_type == "u": # U gate (generalized single qubit gate: U(theta, phi, lambda))
-            circuit.u(params.get("theta", 0), params.get("phi", 0), params.get("lambda", 0), target)
-
-        # Two qubit gates
-        elif gate_type == "cx":
-            circuit.cx(control, target)
-        elif gate_type == "cy":
-            circuit.cy(control, target)
-        elif gate_type == "cz":
-            circuit.cz(control, target)
-        elif gate_type == "swap":
-            circuit.swap(control, target)
-        elif gate_type == "crx":
-            circuit.crx(params.get("theta", 0), control, target)
-        elif gate_type == "cry":
-            circuit.cry(params.get("theta", 0), control, target)
-        elif gate_type == "crz":
-            circuit.crz(params.get("theta", 0), control, target)
-        elif gate_type == "cu": # Controlled U gate (generalized two-qubit gate: CU(theta, phi, lambda, gamma))
-            circuit.cu(params.get("theta", 0), params.get("phi", 0), params.get("lambda", 0), params.get("gamma", 0), control, target)
-
-        # Three-qubit gates
-        elif gate_type == "ccx": # Toffoli gate
+        if type(target) is not int or not 0 <= target < num_qubits:
+            _check_qubit(target, "target", gate_type, num_qubits)
+        control = -1
+        control2 = -1
+        if gate_id in two_qubit_ids:
+            control = gate_info.get("control")
+            if type(control) is not int or not 0 <= control < num_qubits:
+                _check_qubit(control, "control", gate_type, num_qubits)
+        elif gate_id == _CCX_ID:
             control1 = gate_info.get("control1")
             control2 = gate_info.get("control2")
             if control1 is None or control2 is None:
                 raise ValueError(f"Both control1 and control2 must be specified for {gate_type} gate.")
-            circuit.ccx(control1, control2, target)
-        
-        # Measurement gate
-        elif gate_type == "measure":
+            control = _check_qubit(control1, "control1", gate_type, num_qubits)
+            control2 = _check_qubit(control2, "control2", gate_type, num_qubits)
+        elif gate_id == _MEASURE_ID:
             # Map target qubit to a classical bit. Default to the same index.
-            classical_bit = gate_info.get("classical_bit", target)
-            if classical_bit is None: # Fallback if target also happens to be None (should be validated earlier)
-                classical_bit = target # Use target as classical bit if not specified
+            classical_bit = gate_info.get("classical_bit")
+            control = target if classical_bit is None else _check_qubit(classical_bit, "classical_bit", gate_type, num_qubits)
 
-            circuit.measure(target, classical_bit)
-            has_explicit_measurements = True
+        params = gate_info.get("params")
+        if not params:
+            append((gate_id, target, control, control2, 0, 0, 0, 0))
+            continue
+        append((
+            gate_id, target, control, control2,
+            _resolve_param(params.get("theta", 0), symbols), _resolve_param(params.get("phi", 0), symbols),
+            _resolve_param(params.get("lambda", 0), symbols), _resolve_param(params.get("gamma", 0), symbols),
+        ))
+    return normalized
+
+def _resolve_param(value, symbols: dict):
+    """
+    Returns numeric parameters unchanged and turns placeholders such as {"param": "theta_0"}
+    into Qiskit Parameters, reusing one Parameter per name within a circuit.
+    """
+    if isinstance(value, dict):
+        name = value.get("param")
+        if not isinstance(name, str):
+            raise ValueError(f"Invalid parameter placeholder: {value}. Expected {{'param': <name>}}.")
+        if name not in symbols:
+            symbols[name] = Parameter(name)
+        return symbols[name]
+    return value
+
+_SQRT1_2 = 1 / np.sqrt(2)
+_FIXED_MATRICES = {
+    _GATE_IDS["h"]: np.array([[_SQRT1_2, _SQRT1_2], [_SQRT1_2, -_SQRT1_2]], dtype=complex),
+    _GATE_IDS["x"]: np.array([[0, 1], [1, 0]], dtype=complex),
+    _GATE_IDS["y"]: np.array([[0, -1j], [1j, 0]], dtype=complex),
+    _GATE_IDS["z"]: np.diag([1, -1]).astype(complex),
+    _GATE_IDS["s"]: np.diag([1, 1j]),
+    _GATE_IDS["sdg"]: np.diag([1, -1j]),
+    _GATE_IDS["t"]: np.diag([1, np.exp(1j * np.pi / 4)]),
+    _GATE_IDS["tdg"]: np.diag([1, np.exp(-1j * np.pi / 4)]),
+}
+
+def _single_qubit_matrix(record: tuple) -> np.ndarray:
+    """Returns the 2x2 unitary of a normalized single-qubit gate record."""
+    gate_id, theta = record[0], record[4]
+    matrix = _FIXED_MATRICES.get(gate_id)
+    if matrix is not None:
+        return matrix
+    cos, sin = np.cos(theta / 2), np.sin(theta / 2)
+    if gate_id == _GATE_IDS["rx"]:
+        return np.array([[cos, -1j * sin], [-1j * sin, cos]])
+    if gate_id == _GATE_IDS["ry"]:
+        return np.array([[cos, -sin], [sin, cos]], dtype=complex)
+    if gate_id == _GATE_IDS["rz"]:
+        return np.diag([np.exp(-0.5j * theta), np.exp(0.5j * theta)])
+    if gate_id == _GATE_IDS["p"]:
+        return np.diag([1, np.exp(1j * theta)])
+    phi, lam = record[5], record[6] # U gate
+    return np.array([[cos, -np.exp(1j * lam) * sin],
+                     [np.exp(1j * phi) * sin, np.exp(1j * (phi + lam)) * cos]])
+
+def _matrix_to_u_record(target: int, matrix: np.ndarray) -> tuple[tuple, float]:
+    """
+    Decomposes a 2x2 unitary into a normalized U(theta, phi, lam) record plus the
+    global phase that was dropped, so that matrix == exp(i*phase) * U(theta, phi, lam).
+    """
+    # Rescale to SU(2): matrix = exp(i*gamma) * [[a, -conj(b)], [b, conj(a)]]
+    gamma = np.angle(np.linalg.det(matrix)) / 2
+    su2 = matrix * np.exp(-1j * gamma)
+    theta = 2 * np.arctan2(abs(su2[1, 0]), abs(su2[0, 0]))
+    phi_plus_lam = -2 * np.angle(su2[0, 0])
+    phi_minus_lam = 2 * np.angle(su2[1, 0])
+    phi = (phi_plus_lam + phi_minus_lam) / 2
+    lam = (phi_plus_lam - phi_minus_lam) / 2
+    record = (_U_ID, target, -1, -1, float(theta), float(phi), float(lam), 0)
+    return record, float(gamma - phi_plus_lam / 2)
+
+def _fuse_single_qubit_runs(records: list[tuple]) -> tuple[list[tuple], float]:
+    """
+    Collapses runs of consecutive single-qubit gates acting on the same qubit into a
+    single U gate, so Aer applies one kernel per run instead of one per gate.
+    Returns the fused records and the accumulated global phase.
+    """
+    fused = []
+    global_phase = 0.0
+    pending = {} # qubit -> list of single-qubit records not yet emitted
+
+    def flush(qubit):
+        nonlocal global_phase
+        run = pending.pop(qubit, None)
+        if not run:
+            return
+        if len(run) == 1:
+            fused.append(run[0])
+            return
+        matrix = _single_qubit_matrix(run[0])
+        for record in run[1:]:
+            matrix = _single_qubit_matrix(record) @ matrix
+        u_record, phase = _matrix_to_u_record(qubit, matrix)
+        fused.append(u_record)
+        global_phase += phase
+
+    for record in records:
+        gate_id = record[0]
+        # Gates with unbound Parameters have no numeric matrix, so they are never fused
+        if gate_id in _SINGLE_QUBIT_IDS and not any(isinstance(v, Parameter) for v in record[4:]):
+            pending.setdefault(record[1], []).append(record)
+            continue
+        # Multi-qubit gates and measurements end the runs on the qubits they touch
+        flush(record[1])
+        if gate_id != _MEASURE_ID and gate_id not in _SINGLE_QUBIT_IDS:
+            flush(record[2])
+            if gate_id == _CCX_ID:
+                flush(record[3])
+        fused.append(record)
+
+    for qubit in list(pending):
+        flush(qubit)
+    return fused, global_phase
 
+def _is_clifford(record: tuple) -> bool:
+    gate_id = record[0]
+    if gate_id in _CLIFFORD_IDS:
+        return True
+    if gate_id in _ROTATION_IDS and not isinstance(record[4], Parameter):
+        quarter_turns = record[4] / (np.pi / 2)
+        return bool(np.isclose(quarter_turns, round(quarter_turns)))
+    return False
+
+def _build_qiskit_circuit_aer(circuit_data: dict, fuse_single_qubit_gates: bool = True) -> tuple[qiskit.QuantumCircuit, bool, bool]:
+    """
+    Builds a Qiskit QuantumCircuit from the standardized circuit data.
+    Returns the circuit, a boolean indicating if explicit measurement gates were found,
+    and a boolean indicating if every gate is a Clifford gate.
+    """
+    num_qubits = circuit_data["qubits"]
+    gates = _normalize_gates(circuit_data["gates"], num_qubits)
+    all_clifford = all(_is_clifford(record) for record in gates)
+    global_phase = 0.0
+    # Fused U gates are not Clifford, so fusion would rule out the stabilizer method
+    if fuse_single_qubit_gates and not all_clifford:
+        gates, global_phase = _fuse_single_qubit_runs(gates)
+
+    circuit = qiskit.QuantumCircuit(num_qubits, global_phase=global_phase)
+    # Classical bits are only allocated when the circuit actually measures something
+    if any(record[0] == _MEASURE_ID for record in gates):
+        circuit.add_register(ClassicalRegister(num_qubits, "c"))
+    qubits = circuit.qubits
+    clbits = circuit.clbits
+
+    has_explicit_measurements = False
+    append = circuit._append
+    builders = _GATE_BUILDERS
+
+    for record in gates:
+        gate_id = record[0]
+        if gate_id == _MEASURE_ID:
+            circuit.measure(qubits[record[1]], clbits[record[2]])
+            has_explicit_measurements = True
         else:
-            print(f"Warning: Unknown gate type {gate_type}. Skipping.")
+            append(builders[gate_id](qubits, record))
+
+    return circuit, has_explicit_measurements, all_clifford
+
+
+@functools.lru_cache(maxsize=8)
+def _get_simulator(method: str, device: str = "CPU", precision: str = "double") -> qiskit_aer.AerSimulator:
+    """
+    Returns a shared AerSimulator for the given configuration.
+    Constructing a simulator allocates native (and, on GPU builds, CUDA) state, so
+    instances are reused across calls instead of being rebuilt per request.
+    """
+    return qiskit_aer.AerSimulator(method=method, device=device, precision=precision)
+
+
+def _circuit_digest(payload) -> bytes:
+    canonical = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=20).digest()
+
+
+# Content-addressed cache of recent results, keyed by a hash of the circuit and run options.
+_RESULT_CACHE_SIZE = 128
+_RESULT_CACHE = OrderedDict()
+_RESULT_CACHE_LOCK = threading.Lock()
+
+# Credential keys that affect the outcome of a run and therefore belong in the cache key.
+_RESULT_CACHE_OPTIONS = ("simulator_choice", "shots", "method", "device", "precision", "optimization_level",
+                         "batched_shots_gpu", "batched_shots_gpu_max_qubits", "fusion_threshold", "top_k",
+                         "parameter_binds", "counts_format")
+
+def _result_cache_key(circuit_data: dict, credentials: dict) -> bytes:
+    options = [credentials.get(name) for name in _RESULT_CACHE_OPTIONS]
+    return _circuit_digest([circuit_data, options])
+
+
+# Transpiled circuits are reused when the same circuit template is run repeatedly
+# (e.g. sampled runs that bypass the result cache).
+_TRANSPILE_CACHE_SIZE = 64
+_TRANSPILE_CACHE = OrderedDict()
+_TRANSPILE_CACHE_LOCK = threading.Lock()
+
+def _prepare_circuit(circuit_data: dict, backend_name: str, device: str, precision: str,
+                     optimization_level: int, method: str = None) -> tuple[qiskit.QuantumCircuit, str]:
+    """
+    Builds the circuit for the given Aer simulator choice, adds the measurements or
+    save instructions that branch needs, and transpiles it for the chosen simulation method.
+    When no method is requested for the QASM simulator, Clifford-only circuits use the
+    stabilizer method and everything else uses "automatic".
+    Returns the transpiled circuit and the simulation method it was prepared for.
+    """
+    cache_key = (_circuit_digest(circuit_data), backend_name, method, device, precision, optimization_level)
+    with _TRANSPILE_CACHE_LOCK:
+        cached = _TRANSPILE_CACHE.get(cache_key)
+        if cached is not None:
+            _TRANSPILE_CACHE.move_to_end(cache_key)
+            return cached
+
+    # Build the Qiskit circuit and check for explicit measurements
+    circuit, has_explicit_measurements, all_clifford = _build_qiskit_circuit_aer(circuit_data)
 
-    return circuit, has_explicit_measurements
+    if backend_name == "aer_qasm_simulator":
+        # For QASM simulator, measurements are required to get counts.
+        # If no explicit measurements are defined in the circuit data, add them for all qubits.
+        if not has_explicit_measurements:
+            # Measure all quantum bits into their corresponding classical bits
+            circuit.add_register(ClassicalRegister(circuit.num_qubits, "c"))
+            circuit.measure(range(circuit.num_qubits), range(circuit.num_qubits))
+        # Use automatic method for best performance, unless the stabilizer method applies
+        selected_method = method or ("stabilizer" if all_clifford else "automatic")
+    else:
+        # Final measurements would collapse the state, so they are ignored for statevector output
+        circuit.remove_final_measurements(inplace=True)
+        circuit.save_statevector()
+        selected_method = "statevector"
+
+    simulator = _get_simulator(selected_method, device, precision)
+    prepared = (qiskit.transpile(circuit, simulator, optimization_level=optimization_level), selected_method)
+    with _TRANSPILE_CACHE_LOCK:
+        _TRANSPILE_CACHE[cache_key] = prepared
+        if len(_TRANSPILE_CACHE) > _TRANSPILE_CACHE_SIZE:
+            _TRANSPILE_CACHE.popitem(last=False)
+    return prepared
 
 
 def run_aer(circuit_data: dict, credentials: dict) -> dict:
     """
     Runs a quantum circuit on a Qiskit Aer simulator.
+    For the statevector simulator, "statevector" is returned as a complex NumPy array.
+
+    Recognized credentials keys:
+        simulator_choice: "aer_qasm_simulator" or "aer_statevector_simulator".
+        shots: Number of shots for the QASM simulator (default 1024).
+        method: Aer simulation method for the QASM simulator. By default Clifford-only
+                circuits use "stabilizer" and all others use "automatic".
+        device: Aer device, "CPU" (default) or "GPU".
+        precision: "double" (default) or "single". Single precision halves the memory
+                   traffic of statevector simulation and is much faster on GPUs with
+                   limited FP64 throughput, at the cost of numerical accuracy.
+        batched_shots_gpu: Run all shots of a QASM simulation in a single batched GPU
+                           kernel per gate (only applied when device is "GPU").
+        batched_shots_gpu_max_qubits: Largest circuit for which shot batching is used (default 16).
+        optimization_level: Transpiler optimization level used before running (default 0).
+        fusion_threshold: Minimum qubit count for Aer's gate fusion pass (default 14).
+        top_k: If set, only the top_k most probable basis states are returned in "probabilities".
+        parameter_binds: Values for parameter placeholders ({"param": <name>} in a gate's params),
+                         as a list with one {name: [values...]} dict per circuit. The circuit is
+                         compiled once and run for every value set; "counts", "statevector" and
+                         "probabilities" then become lists with one entry per value set.
+        counts_format: "dict" (default) for {bitstring: count}, or "arrays" for
+                       {"basis_indices": [...], "counts": [...]} sorted by basis index.
+        cache_sampled_results: Also serve QASM (shot-sampled) runs from the result cache.
+                               Statevector results are deterministic and always cached.
+    """
+    # Sampled counts differ between runs, so they are only cached when the caller opts in.
+    # A statevector is only deterministic without mid-circuit measurements.
+    cacheable = ((credentials.get("simulator_choice") == "aer_statevector_simulator"
+                  and not _has_mid_circuit_measurement(circuit_data.get("gates", [])))
+                 or credentials.get("cache_sampled_results", False))
+    if not cacheable:
+        return _run_aer_uncached(circuit_data, credentials)
+
+    cache_key = _result_cache_key(circuit_data, credentials)
+    with _RESULT_CACHE_LOCK:
+        cached = _RESULT_CACHE.get(cache_key)
+        if cached is not None:
+            _RESULT_CACHE.move_to_end(cache_key)
+    if cached is not None:
+        # Callers may modify the result (including nested dicts/arrays), so hand out a deep copy
+        return copy.deepcopy(cached)
+
+    result = _run_aer_uncached(circuit_data, credentials)
+    if "error" not in result:
+        result_copy = copy.deepcopy(result)
+        with _RESULT_CACHE_LOCK:
+            _RESULT_CACHE[cache_key] = result_copy
+            if len(_RESULT_CACHE) > _RESULT_CACHE_SIZE:
+                _RESULT_CACHE.popitem(last=False)
+    return result
+
+
+def _has_mid_circuit_measurement(gates: list) -> bool:
+    """
+    True if a qubit is measured and then acted on again. Final measurements are removed before a
+    statevector run, but a mid-circuit one collapses the state at random.
     """
+    touched = set() # Qubits used by a later gate
+    for gate_info in reversed(gates):
+        if str(gate_info.get("gate", "")).lower() == "measure":
+            if gate_info.get("target") in touched:
+                return True
+        else:
+            touched.update(gate_info.get(role) for role in ("target", "control", "control1", "control2"))
+    return False
+
+
+def _run_aer_uncached(circuit_data: dict, credentials: dict) -> dict:
     try:
-        # Build the Qiskit circuit and check for explicit measurements
-        circuit, has_explicit_measurements = _build_qiskit_circuit_aer(circuit_data)
+        return _execute_aer([circuit_data], credentials)[0]
+    except Exception as e:
+        # Include the backend name in the error for better debugging
+        return {"error": str(e), "backend_used": credentials.get("backend_name", "N/A")}
 
-        # Determine the simulator backend based on credentials
-        backend_name = credentials.get("simulator_choice", "qasm_simulator")
-        shots = credentials.get("shots", 1024)
 
+def run_aer_batch(batch: list[dict], credentials: dict) -> list[dict]:
+    """
+    Runs several circuits on the same Aer simulator in a single job, so the
+    per-job launch overhead is paid once instead of once per circuit.
+    Accepts the same credentials keys as run_aer and returns one result dict per circuit.
+    """
+    try:
+        return _execute_aer(batch, credentials)
+    except Exception as e:
+        error = {"error": str(e), "backend_used": credentials.get("backend_name", "N/A")}
+        return [dict(error) for _ in batch]
+
+
+def run_aer_many(batch: list[dict], credentials: dict, n_workers: int = None) -> list[dict]:
+    """
+    Like run_aer_batch, but builds and transpiles the circuits in parallel worker processes
+    before submitting them to Aer as a single job. Circuit construction is pure Python and
+    holds the GIL, so processes (not threads) are used; Aer parallelizes the simulation itself.
+    n_workers defaults to the number of CPUs.
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    try:
+        return _execute_aer(batch, credentials, n_workers=n_workers)
+    except Exception as e:
+        error = {"error": str(e), "backend_used": credentials.get("backend_name", "N/A")}
+        return [dict(error) for _ in batch]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_build_pool(n_workers: int) -> concurrent.futures.ProcessPoolExecutor:
+    # Worker processes are expensive to start, so one pool per size is kept for the process lifetime.
+    # Workers are spawned rather than forked: forking the threaded server (request threads, the batch
+    # executor, Aer's OpenMP pool) can deadlock the child on a lock held by another thread.
+    return concurrent.futures.ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _basis_labels(indices: np.ndarray, num_qubits: int) -> list[str]:
+    """
+    Returns the zero-padded big-endian bitstring of each basis-state index, built with
+    NumPy shifts and masks instead of one format() call per index.
+    """
+    if num_qubits == 0:
+        return [""] * len(indices)
+    shifts = np.arange(num_qubits - 1, -1, -1, dtype=np.uint64)
+    bits = ((indices.astype(np.uint64)[:, None] >> shifts) & 1).astype(np.uint8)
+    bits += ord('0')
+    # Reinterpret each row of ASCII digits as one fixed-width byte string
+    return np.ascontiguousarray(bits).view(f'S{num_qubits}').ravel().astype(f'U{num_qubits}').tolist()
+
+
+def _statevector_probabilities(statevector_arr: np.ndarray, num_qubits: int, top_k) -> dict:
+    # Calculate probabilities from statevector for display (vectorized in NumPy)
+    probs_arr = np.square(np.abs(statevector_arr))
+    if top_k is not None and (type(top_k) is not int or top_k < 1):
+        raise ValueError(f"Invalid top_k: {top_k}. Must be a positive integer.")
+    if top_k and top_k < len(probs_arr):
+        # Only label the k most likely basis states instead of all 2^n of them,
+        # most likely first (argpartition leaves the k entries unordered)
+        top_idx = np.argpartition(-probs_arr, top_k)[:top_k]
+        top_idx = top_idx[np.argsort(-probs_arr[top_idx], kind="stable")]
+        return dict(zip(_basis_labels(top_idx, num_qubits), probs_arr[top_idx].tolist()))
+    if num_qubits > 20 and not top_k:
+        print(f"Warning: Building full probability table for {num_qubits} qubits. Consider setting 'top_k'.")
+    return dict(zip(_basis_labels(np.arange(len(probs_arr)), num_qubits), probs_arr.tolist()))
+
+
+def _bind_parameters(circuits: list, parameter_binds) -> tuple[list[dict], list[int]]:
+    """
+    Maps the per-circuit {name: [values...]} dicts onto each circuit's Parameters.
+    Returns Aer's parameter_binds argument and the number of experiments each circuit expands to.
+    """
+    if isinstance(parameter_binds, dict):
+        parameter_binds = [parameter_binds]
+    if len(parameter_binds) != len(circuits):
+        raise ValueError(f"Expected {len(circuits)} parameter_binds entries, got {len(parameter_binds)}.")
+
+    binds = []
+    sizes = []
+    for circuit, named_values in zip(circuits, parameter_binds):
+        by_name = {param.name: param for param in circuit.parameters}
+        missing = set(by_name) - set(named_values)
+        if missing:
+            raise ValueError(f"No values bound for parameters: {', '.join(sorted(missing))}")
+        bound = {by_name[name]: list(values) for name, values in named_values.items() if name in by_name}
+        lengths = {len(values) for values in bound.values()}
+        if len(lengths) > 1:
+            raise ValueError("All parameters of a circuit must be bound to the same number of values.")
+        binds.append(bound)
+        sizes.append(lengths.pop() if lengths else 1)
+    return binds, sizes
+
+
+def _counts_arrays(hex_counts: dict) -> dict:
+    """
+    Converts Aer's raw {"0x..": count} histogram into parallel NumPy arrays of basis-state
+    indices and counts, sorted by index, without materializing a bitstring per outcome.
+    """
+    indices = np.fromiter((int(key, 16) for key in hex_counts), dtype=np.uint64, count=len(hex_counts))
+    counts = np.fromiter(hex_counts.values(), dtype=np.int64, count=len(hex_counts))
+    order = np.argsort(indices)
+    return {"basis_indices": indices[order], "counts": counts[order]}
+
+
+def _execute_aer(batch: list[dict], credentials: dict, n_workers: int = None) -> list[dict]:
+    """
+    Builds every circuit in the batch and submits them to Aer as one job.
+    With n_workers > 1, circuits are prepared in a process pool. A circuit that fails to build
+    gets an error entry; the others still run. Results are returned in batch order.
+    """
+    # Determine the simulator backend based on credentials
+    backend_name = credentials.get("simulator_choice", "qasm_simulator")
+    shots = credentials.get("shots", 1024)
+    device = credentials.get("device", "CPU")
+    precision = credentials.get("precision", "double")
+    if precision not in ("double", "single"):
+        raise ValueError(f"Unsupported Aer precision: {precision}. Must be 'double' or 'single'.")
+    fusion_threshold = credentials.get("fusion_threshold", 14)
+    optimization_level = credentials.get("optimization_level", 0)
+    parameter_binds = credentials.get("parameter_binds")
+
+    if backend_name == "aer_statevector_simulator": # Consistent naming with BACKEND_MAP
+        shots = 1 # Statevector doesn't need shots
+    elif backend_name != "aer_qasm_simulator":
+        raise ValueError(f"Unsupported Aer simulator: {backend_name}")
+
+    if parameter_binds:
+        if isinstance(parameter_binds, dict):
+            parameter_binds = [parameter_binds]
+        if len(parameter_binds) != len(batch):
+            raise ValueError(f"Expected {len(batch)} parameter_binds entries, got {len(parameter_binds)}.")
+
+    # Each circuit is prepared on its own, so one invalid circuit only fails its own entry
+    method = credentials.get("method")
+    prepared = [] # (batch index, circuit, method) of the circuits that built
+    responses = [None] * len(batch)
+    if n_workers and n_workers > 1 and len(batch) > 1:
+        pool = _get_build_pool(n_workers)
+        futures = [pool.submit(_prepare_circuit, cd, backend_name, device, precision, optimization_level, method)
+                   for cd in batch]
+        for index, future in enumerate(futures):
+            try:
+                prepared.append((index, *future.result()))
+            except Exception as e:
+                responses[index] = {"error": str(e), "backend_used": credentials.get("backend_name", "N/A")}
+    else:
+        for index, cd in enumerate(batch):
+            try:
+                prepared.append((index, *_prepare_circuit(cd, backend_name, device, precision, optimization_level, method)))
+            except Exception as e:
+                responses[index] = {"error": str(e), "backend_used": credentials.get("backend_name", "N/A")}
+    if not prepared:
+        return responses
+
+    circuits = [circuit for _, circuit, _ in prepared]
+    methods = {method for _, _, method in prepared}
+    # A mixed batch runs under "automatic", which accepts every circuit prepared above
+    simulator = _get_simulator(methods.pop() if len(methods) == 1 else "automatic", device, precision)
+
+    # Options are passed per run so the cached simulator is not mutated.
+    run_options = {"fusion_enable": True, "fusion_threshold": fusion_threshold}
+    # Shot batching only pays off on GPU; on CPU it is slower than the default path.
+    if backend_name == "aer_qasm_simulator" and device == "GPU" and shots > 1 and credentials.get("batched_shots_gpu", False):
+        run_options["batched_shots_gpu"] = True
+        run_options["batched_shots_gpu_max_qubits"] = credentials.get("batched_shots_gpu_max_qubits", 16)
+    # Each circuit runs once per bound value set; experiments come back in circuit order
+    sizes = [1] * len(circuits)
+    if parameter_binds:
+        run_options["parameter_binds"], sizes = _bind_parameters(
+            circuits, [parameter_binds[index] for index, _, _ in prepared])
+
+    result = simulator.run(circuits, shots=shots, **run_options).result()
+
+    top_k = credentials.get("top_k")
+    counts_format = credentials.get("counts_format", "dict")
+    offset = 0
+    for (index, _, _), size in zip(prepared, sizes):
+        cd = batch[index]
+        experiments = range(offset, offset + size)
+        offset += size
         if backend_name == "aer_qasm_simulator":
-            # For QASM simulator, measurements are required to get counts.
-            # If no explicit measurements are defined in the circuit data, add them for all qubits.
-            if not has_explicit_measurements:
-                # Measure all quantum bits into their corresponding classical bits
-                circuit.measure(range(circuit.num_qubits), range(circuit.num_qubits))
-
-            simulator = qiskit_aer.AerSimulator(method='automatic') # Use automatic method for best performance
-            job = qiskit.execute(circuit, simulator, shots=shots)
-            result = job.result()
-            counts = result.get_counts(circuit) # This should now work as measurements are guaranteed
-
-            return {
+            # Measurements are guaranteed by _prepare_circuit
+            if counts_format == "arrays":
+                counts = [_counts_arrays(result.data(i)["counts"]) for i in experiments]
+            else:
+                counts = [result.get_counts(i) for i in experiments]
+            responses[index] = {
                 "backend_used": "Aer QASM Simulator",
-                "num_qubits": circuit_data["qubits"],
-                "counts": counts,
+                "num_qubits": cd["qubits"],
+                "counts": counts if parameter_binds else counts[0],
                 "statevector": None, # QASM simulators don't directly give statevector
                 "probabilities": None # Probabilities are derived from counts, not statevector
             }
-        elif backend_name == "aer_statevector_simulator": # Consistent naming with BACKEND_MAP
-            simulator = qiskit_aer.AerSimulator(method='statevector')
-            job = qiskit.execute(circuit, simulator) # Statevector doesn't need shots, and measurements are ignored for statevector output
-
-            result = job.result()
-            statevector = result.get_statevector(circuit).tolist()
-            
-            # Calculate probabilities from statevector for display
-            probabilities = {
-                format(i, f'0{circuit_data["qubits"]}b'): abs(amp)**2
-                for i, amp in enumerate(statevector)
-            }
-            return {
+        else:
+            # Keep the statevector as a contiguous complex NumPy array instead of boxing
+            # every amplitude into a Python complex; the API layer serializes it.
+            statevectors = [np.asarray(result.get_statevector(i)) for i in experiments]
+            probabilities = [_statevector_probabilities(sv, cd["qubits"], top_k) for sv in statevectors]
+            responses[index] = {
                 "backend_used": "Aer Statevector Simulator",
-                "num_qubits": circuit_data["qubits"],
+                "num_qubits": cd["qubits"],
                 "counts": None, # Statevector simulator doesn't return counts directly
-                "statevector": statevector,
-                "probabilities": probabilities
+                "statevector": statevectors if parameter_binds else statevectors[0],
+                "probabilities": probabilities if parameter_binds else probabilities[0]
             }
-        else:
-            raise ValueError(f"Unsupported Aer simulator: {backend_name}")
-
-    except Exception as e:
-        # Include the backend name in the error for better debugging
-        return {"error": str(e), "backend_used": credentials.get("backend_name", "N/A")}
\ No newline at end of file
+    return responses
@@ -1,26 +1,40 @@
 # app.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from dotenv import load_dotenv, find_dotenv
 import os
 import traceback
 import atexit
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
-
-# Import Qiskit components for transpilation
-from qiskit import QuantumCircuit, transpile
-from qiskit_aer import AerSimulator # For using AerSimulator as a target backend for transpilation
-# If you want to use fake backends for specific topologies:
-# from qiskit.providers.fake_provider import FakeLima, FakeManhattan # Example fake backends
+import re
+import hashlib
+import threading
+import time
+import uuid
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from collections.abc import Mapping
+from types import MappingProxyType
+import numpy as np
+import msgspec
+
+# Circuit transpilation runs in a worker pool (see transpiler.py)
+from transpiler import get_transpile_pool, transpile_for_backend
 
 # Import backend modules
 from ibm_backend import run_ibm
 from ionq_backend import run_ionq
-from rigetti_backend import run_rigetti
+from rigetti_backend import run_rigetti, run_rigetti_batch
 from cirq_backend import run_cirq
 from pennylane_backend import run_pennylane
-from aer_backend import run_aer
+from aer_backend import run_aer, run_aer_batch
+from schemas import (RunRequest, RunBatchRequest, SaveCredentialsRequest, TranspileRequest, GateSuggestion, CircuitFinding,
+                     circuit_to_dict)
 
 # Load environment variables from .env file
 dotenv_path = find_dotenv()
@@ -29,12 +43,74 @@ if dotenv_path:
 else:
     print("Warning: .env file not found. Ensure it exists in the same directory as app.py.")
 
+class NumpyJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that understands the NumPy arrays/scalars returned by the backend runners.
+    Complex values are encoded as [real, imag] pairs.
+    Encoding and decoding go through msgspec, which is several times faster than the stdlib
+    json module for large count/statevector payloads. Output is always compact.
+    """
+    def dumps(self, obj, **kwargs):
+        order = "sorted" if kwargs.get("sort_keys", self.sort_keys) else None
+        return msgspec.json.encode(obj, enc_hook=kwargs.get("default", self.default), order=order).decode()
+
+    def loads(self, s, **kwargs):
+        return msgspec.json.decode(s)
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, np.ndarray):
+            if np.iscomplexobj(o):
+                return np.stack((o.real, o.imag), axis=-1).tolist()
+            return o.tolist()
+        if isinstance(o, (complex, np.complexfloating)):
+            return [o.real, o.imag]
+        if isinstance(o, np.generic):
+            return o.item()
+        if isinstance(o, Mapping): # Lazy views such as pennylane_backend.StatevectorProbabilities
+            return dict(o)
+        return DefaultJSONProvider.default(o)
+
 app = Flask(__name__)
+app.json = NumpyJSONProvider(app)
 CORS(app) # Enable CORS for all routes
 
 # In-memory storage for credentials. This dictionary will hold credentials
 # only while the Flask server is running.
-_in_memory_credentials_store = {}
+# Saved entries are read-only MappingProxyType views, so readers can share them without copying;
+# writers take the lock.
+_in_memory_credentials_store: dict[str, MappingProxyType] = {}
+_in_memory_credentials_lock = threading.RLock()
+
+# Optional shared store. When REDIS_URL is set, saved credentials and cached Gemini answers live in
+# Redis, so every gunicorn worker (or server behind a load balancer) sees the same state.
+REDIS_URL = os.getenv("REDIS_URL")
+_REDIS_KEY_PREFIX = "quantum_simulator:"
+_REDIS_CREDENTIALS_TTL = 3600 # seconds; saved credentials expire instead of living until shutdown
+_redis_client = None
+if REDIS_URL:
+    try:
+        import redis
+        _redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=1)
+    except ImportError:
+        print("Warning: REDIS_URL is set but the 'redis' package is not installed. Using in-process stores.")
+
+def _redis_get(key: str):
+    # Returns the decoded value, or None if it is missing or Redis is unreachable
+    try:
+        value = _redis_client.get(_REDIS_KEY_PREFIX + key)
+    except redis.RedisError as e:
+        app.logger.warning(f"Redis read failed for '{key}': {e}")
+        return None
+    return None if value is None else msgspec.json.decode(value)
+
+def _redis_set(key: str, value, ttl: int) -> bool:
+    try:
+        _redis_client.set(_REDIS_KEY_PREFIX + key, msgspec.json.encode(value), ex=ttl)
+        return True
+    except redis.RedisError as e:
+        app.logger.warning(f"Redis write failed for '{key}': {e}")
+        return False
 
 # Define mapping from frontend backend names to provider functions and types
 # 'provider_type': 'qpu' or 'simulator'
@@ -50,7 +126,7 @@ BACKEND_MAP = {
     "aws_local": {"provider": "ionq", "runner": run_ionq, "backend_name": "local", "provider_type": "simulator"}, # AWS Braket local
 
     # Rigetti backends via AWS Braket
-    "aws_rigetti": {"provider": "rigetti", "runner": run_rigetti, "backend_name": "rigetti/qpu", "provider_type": "qpu"}, # Placeholder for Rigetti QPU ARN
+    "aws_rigetti": {"provider": "rigetti", "runner": run_rigetti, "batch_runner": run_rigetti_batch, "backend_name": "rigetti/qpu", "provider_type": "qpu"}, # Placeholder for Rigetti QPU ARN
     
     # Google Cirq local simulator
     "google_cirq": {"provider": "cirq", "runner": run_cirq, "backend_name": "cirq_simulator", "provider_type": "simulator"},
@@ -59,66 +135,214 @@ BACKEND_MAP = {
     "pennylane_default": {"provider": "pennylane", "runner": run_pennylane, "backend_name": "default.qubit", "provider_type": "simulator"},
     "pennylane_lightning": {"provider": "pennylane", "runner": run_pennylane, "backend_name": "lightning.qubit", "provider_type": "simulator"},
 
-    # General Aer Simulator (often used for fallback)
-    "aer_qasm_simulator": {"provider": "aer", "runner": run_aer, "backend_name": "aer_qasm_simulator", "provider_type": "simulator"},
-    "aer_statevector_simulator": {"provider": "aer", "runner": run_aer, "backend_name": "aer_statevector_simulator", "provider_type": "simulator"},
+    # General Aer Simulator (often used for fallback). "batch_runner" runs a list of circuits as one job
+    # (Rigetti: submits every task before awaiting any result).
+    "aer_qasm_simulator": {"provider": "aer", "runner": run_aer, "batch_runner": run_aer_batch, "backend_name": "aer_qasm_simulator", "provider_type": "simulator"},
+    "aer_statevector_simulator": {"provider": "aer", "runner": run_aer, "batch_runner": run_aer_batch, "backend_name": "aer_statevector_simulator", "provider_type": "simulator"},
 }
 
 # Gemini API configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # Using gemini-1.5-flash as it's generally good for chat and structured output
 GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+# Server-sent events variant, used by /chat when the client asks for a streamed reply
+GEMINI_STREAM_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:streamGenerateContent"
 GEMINI_MODEL = "gemini-1.5-flash" 
 
-def _get_credentials_for_provider(provider_key: str) -> dict:
+# Shared HTTP session for Gemini calls. Reusing pooled keep-alive connections avoids a new
+# TCP + TLS handshake to the Gemini API on every request.
+_GEMINI_SESSION = requests.Session()
+_GEMINI_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=None),
+))
+atexit.register(_GEMINI_SESSION.close)
+# (connect, read) timeouts in seconds, so a stalled Gemini call cannot hold a worker thread indefinitely
+GEMINI_TIMEOUT = (5, 30)
+
+# Responses that are a function of the request circuit carry an ETag derived from the circuit hash.
+# A client that sends it back in If-None-Match gets an empty 304 instead of a re-computed answer.
+_CONDITIONAL_MAX_AGE = 300 # seconds
+
+def _etag_for(cache_key) -> str:
+    return hashlib.blake2b(repr(cache_key).encode(), digest_size=8).hexdigest()
+
+def _not_modified(etag: str):
+    # Returns a 304 response if the client already holds this ETag, otherwise None
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def _conditional_response(payload: dict, etag: str):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = _CONDITIONAL_MAX_AGE
+    return response
+
+# Parsed Gemini answers for /suggest_gates and /fix_circuit, keyed by endpoint and a hash of the
+# circuit payload. Re-clicking with an unchanged circuit then skips the Gemini round trip.
+_GEMINI_CACHE_SIZE = 512
+_GEMINI_CACHE_TTL = 3600 # seconds
+_GEMINI_CACHE = OrderedDict() # key -> (expires_at, payload)
+_GEMINI_CACHE_LOCK = threading.Lock()
+
+def _gemini_cache_key(endpoint: str, payload) -> tuple:
+    canonical = json.dumps(payload, sort_keys=True, default=str)
+    return endpoint, hashlib.blake2b(canonical.encode(), digest_size=16).digest()
+
+def _gemini_cache_get(key):
+    if _redis_client is not None:
+        endpoint, digest = key
+        return _redis_get(f"gemini:{endpoint}:{digest.hex()}")
+    with _GEMINI_CACHE_LOCK:
+        entry = _GEMINI_CACHE.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at < time.monotonic():
+            del _GEMINI_CACHE[key]
+            return None
+        _GEMINI_CACHE.move_to_end(key)
+        return payload
+
+def _gemini_cache_put(key, payload):
+    if _redis_client is not None:
+        endpoint, digest = key
+        _redis_set(f"gemini:{endpoint}:{digest.hex()}", payload, _GEMINI_CACHE_TTL)
+        return
+    with _GEMINI_CACHE_LOCK:
+        _GEMINI_CACHE[key] = (time.monotonic() + _GEMINI_CACHE_TTL, payload)
+        _GEMINI_CACHE.move_to_end(key)
+        if len(_GEMINI_CACHE) > _GEMINI_CACHE_SIZE:
+            _GEMINI_CACHE.popitem(last=False)
+
+# Credentials read from the environment (.env or system). These do not change while the
+# server is running, so they are read once at import instead of on every request.
+# The snapshot is frozen because _get_credentials_for_provider hands it out without copying.
+_AWS_ENV_CREDENTIALS = MappingProxyType({
+    "AWS_ACCESS_KEY_ID": os.getenv("AWS_ACCESS_KEY_ID"),
+    "AWS_SECRET_ACCESS_KEY": os.getenv("AWS_SECRET_ACCESS_KEY"),
+    "AWS_REGION": os.getenv("AWS_REGION"),
+})
+_ENV_CREDENTIALS = MappingProxyType({
+    "ibm": MappingProxyType({"IBMQ_TOKEN": os.getenv("IBMQ_TOKEN")}),
+    "ionq": _AWS_ENV_CREDENTIALS,
+    "rigetti": _AWS_ENV_CREDENTIALS,
+    "quantinuum": MappingProxyType({
+        "AZURE_QUANTUM_SUBSCRIPTION_ID": os.getenv("AZURE_QUANTUM_SUBSCRIPTION_ID"),
+        "AZURE_QUANTUM_WORKSPACE_NAME": os.getenv("AZURE_QUANTUM_WORKSPACE_NAME"),
+        "AZURE_QUANTUM_RESOURCE_GROUP": os.getenv("AZURE_QUANTUM_RESOURCE_GROUP"),
+        "AZURE_QUANTUM_LOCATION": os.getenv("AZURE_QUANTUM_LOCATION"),
+    }),
+    "pennylane": MappingProxyType({"PENNYLANE_API_KEY": os.getenv("PENNYLANE_API_KEY")}),
+})
+_NO_CREDENTIALS = MappingProxyType({}) # For providers without environment credentials (e.g. local simulators)
+
+def _get_credentials_for_provider(provider_key: str) -> Mapping:
     """
     Retrieves relevant credentials, prioritizing in-memory store, then environment variables.
+    The returned mapping is shared and read-only; callers build their own dict from it.
     """
-    credentials = {}
-    
-    # First, try to get from in-memory store
-    if provider_key in _in_memory_credentials_store:
-        return _in_memory_credentials_store[provider_key].copy() # Return a copy to prevent external modification
-
-    # If not in memory, fall back to environment variables (from .env or system)
-    if provider_key == "ibm":
-        credentials["IBMQ_TOKEN"] = os.getenv("IBMQ_TOKEN")
-    elif provider_key == "ionq" or provider_key == "rigetti":
-        credentials["AWS_ACCESS_KEY_ID"] = os.getenv("AWS_ACCESS_KEY_ID")
-        credentials["AWS_SECRET_ACCESS_KEY"] = os.getenv("AWS_SECRET_ACCESS_KEY")
-        credentials["AWS_REGION"] = os.getenv("AWS_REGION")
-    elif provider_key == "quantinuum":
-        credentials["AZURE_QUANTUM_SUBSCRIPTION_ID"] = os.getenv("AZURE_QUANTUM_SUBSCRIPTION_ID")
-        credentials["AZURE_QUANTUM_WORKSPACE_NAME"] = os.getenv("AZURE_QUANTUM_WORKSPACE_NAME")
-        credentials["AZURE_QUANTUM_RESOURCE_GROUP"] = os.getenv("AZURE_QUANTUM_RESOURCE_GROUP")
-        credentials["AZURE_QUANTUM_LOCATION"] = os.getenv("AZURE_QUANTUM_LOCATION")
-    elif provider_key == "pennylane":
-        credentials["PENNYLANE_API_KEY"] = os.getenv("PENNYLANE_API_KEY")
-    return credentials
+    if _redis_client is not None:
+        saved = _redis_get(f"credentials:{provider_key}")
+    else:
+        saved = _in_memory_credentials_store.get(provider_key)
+    return saved or _ENV_CREDENTIALS.get(provider_key, _NO_CREDENTIALS)
+
+
+# Keywords that mark a runner's ValueError as a credential/connection problem (eligible for fallback)
+_CREDENTIAL_ERROR_RE = re.compile(r"credentials|token|access key|connection|authentication", re.IGNORECASE)
+
+def _attempt_fallback(circuit_data, simulator_choice_key, shots, precision, top_k, provider_key,
+                      failure_summary, reason, original_backend_used):
+    """
+    Re-runs a circuit on the fallback simulator after the original QPU execution failed.
+
+    Returns:
+        tuple: (response payload dict, HTTP status code)
+    """
+    fallback_backend_info = BACKEND_MAP.get(simulator_choice_key)
+    if not fallback_backend_info or fallback_backend_info["provider_type"] == "qpu":
+        # Fallback simulator is invalid or also a QPU
+        return {
+            "error": f"{failure_summary}. Invalid fallback simulator choice: {simulator_choice_key}. Cannot proceed.",
+            "backend_used": original_backend_used
+        }, 500
+
+    fallback_runner = fallback_backend_info["runner"]
+    fallback_backend_name = fallback_backend_info["backend_name"]
+
+    fallback_credentials = {
+        **_get_credentials_for_provider(fallback_backend_info["provider"]),
+        "backend_name": fallback_backend_name,
+        "shots": shots,
+        "simulator_choice": simulator_choice_key, # Pass for consistency
+        "precision": precision,
+        "top_k": top_k,
+    }
+
+    fallback_result = fallback_runner(circuit_data, fallback_credentials)
+
+    if fallback_result and "error" in fallback_result:
+        # Fallback also failed
+        return {
+            "error": f"{failure_summary}. Fallback to '{fallback_backend_name}' also failed: {fallback_result['error']}",
+            "backend_used": fallback_result.get("backend_used", "None"),
+            "original_backend_attempted": provider_key, # Indicate which QPU was attempted
+            "fallback_reason": reason # Reason for original failure
+        }, 500
+
+    # Fallback succeeded
+    fallback_result["backend_used"] = f"FALLBACK: {fallback_result['backend_used']} (original target: {provider_key})"
+    fallback_result["original_backend_attempted"] = provider_key
+    fallback_result["fallback_reason"] = reason
+    return fallback_result, 200
+
+# Simulation results can also be sent as MessagePack when the client asks for it with
+# "Accept: application/msgpack". Complex statevectors then travel as raw complex64 bytes
+# ({"dtype", "shape", "data"}; read with new Float32Array(data) as re/im pairs) instead of a
+# JSON list of [re, im] pairs, which is far smaller and faster to produce for large circuits.
+_MSGPACK_MIMETYPE = "application/msgpack"
+
+def _msgpack_default(o):
+    if isinstance(o, np.ndarray):
+        if np.iscomplexobj(o):
+            return {"dtype": "complex64", "shape": list(o.shape), "data": np.ascontiguousarray(o, dtype=np.complex64).tobytes()}
+        return o.tolist()
+    return NumpyJSONProvider.default(o)
+
+def _result_response(payload: dict, status: int = 200):
+    if request.accept_mimetypes.best_match(["application/json", _MSGPACK_MIMETYPE]) == _MSGPACK_MIMETYPE:
+        return Response(msgspec.msgpack.encode(payload, enc_hook=_msgpack_default), status=status, mimetype=_MSGPACK_MIMETYPE)
+    return jsonify(payload), status
 
 
 @app.route('/run', methods=['POST'])
 def run_circuit():
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "Invalid JSON payload"}), 400
+    try:
+        # Decode and validate the whole payload in one pass; missing optional fields get their defaults
+        run_request = msgspec.json.decode(request.get_data(), type=RunRequest)
+    except msgspec.DecodeError as e:
+        return jsonify({"error": f"Invalid request payload: {e}"}), 400
     
-    print("Incoming data:", data)
-
-    provider_key = data.get("provider")
-    circuit_data = data.get("circuit")
-    # Normalize circuit data to ensure every gate has 'qubits'
-    for gate in circuit_data.get("gates", []):
-        if "qubits" not in gate or not isinstance(gate["qubits"], list):
-            gate["qubits"] = []
+    print("Incoming data:", run_request)
 
-    use_simulator_if_qpu_fails = data.get("use_simulator_if_qpu_fails", False)
-    simulator_choice_key = data.get("simulator_choice", "aer_qasm_simulator") # Default fallback to Aer QASM
-    shots = data.get("shots", 1024)
+    provider_key = run_request.provider
+    use_simulator_if_qpu_fails = run_request.use_simulator_if_qpu_fails
+    simulator_choice_key = run_request.simulator_choice
+    shots = run_request.shots
+    precision = run_request.precision
+    top_k = run_request.top_k
 
-    if not provider_key or not circuit_data:
+    if not provider_key or run_request.circuit is None:
         return jsonify({"error": "Missing 'provider' or 'circuit' in payload"}), 400
 
+    circuit_data = circuit_to_dict(run_request.circuit)
+
     selected_backend_info = BACKEND_MAP.get(provider_key)
 
     if not selected_backend_info:
@@ -130,10 +354,14 @@ def run_circuit():
     current_provider_name = selected_backend_info["provider"] # e.g., "ibm", "ionq"
 
     # Prepare credentials dictionary, including the specific backend name and shots
-    credentials = _get_credentials_for_provider(current_provider_name)
-    credentials["backend_name"] = actual_backend_name
-    credentials["shots"] = shots
-    credentials["simulator_choice"] = simulator_choice_key # Pass to runner for consistency
+    credentials = {
+        **_get_credentials_for_provider(current_provider_name),
+        "backend_name": actual_backend_name,
+        "shots": shots,
+        "simulator_choice": simulator_choice_key, # Pass to runner for consistency
+        "precision": precision,
+        "top_k": top_k,
+    }
 
     is_qpu = (provider_type == "qpu")
     
@@ -145,87 +373,33 @@ def run_circuit():
             # If the primary execution (QPU or simulator) resulted in an error
             if is_qpu and use_simulator_if_qpu_fails:
                 app.logger.warning(f"QPU execution failed for '{provider_key}': {result['error']}. Falling back to {simulator_choice_key}.")
-                
-                fallback_backend_info = BACKEND_MAP.get(simulator_choice_key)
-                if not fallback_backend_info or fallback_backend_info["provider_type"] == "qpu":
-                    # Fallback simulator is invalid or also a QPU
-                    return jsonify({
-                        "error": f"Original execution on '{provider_key}' failed: {result['error']}. "
-                                 f"Invalid fallback simulator choice: {simulator_choice_key}. Cannot proceed.",
-                        "backend_used": result.get("backend_used", "None") # Show original backend if available
-                    }), 500
-                
-                fallback_runner = fallback_backend_info["runner"]
-                fallback_backend_name = fallback_backend_info["backend_name"]
-                fallback_provider_name = fallback_backend_info["provider"]
-                
-                fallback_credentials = _get_credentials_for_provider(fallback_provider_name)
-                fallback_credentials["backend_name"] = fallback_backend_name
-                fallback_credentials["shots"] = shots
-                fallback_credentials["simulator_choice"] = simulator_choice_key # Pass for consistency
-
-                fallback_result = fallback_runner(circuit_data, fallback_credentials)
-                
-                if fallback_result and "error" in fallback_result:
-                    # Fallback also failed
-                    return jsonify({
-                        "error": f"Original execution on '{provider_key}' failed: {result['error']}. "
-                                 f"Fallback to '{fallback_backend_name}' also failed: {fallback_result['error']}",
-                        "backend_used": fallback_result.get("backend_used", "None"),
-                        "original_backend_attempted": provider_key # Indicate which QPU was attempted
-                    }), 500
-                else:
-                    # Fallback succeeded
-                    fallback_result["backend_used"] = f"FALLBACK: {fallback_result['backend_used']} (original target: {provider_key})"
-                    fallback_result["original_backend_attempted"] = provider_key # Add this field
-                    fallback_result["fallback_reason"] = result["error"] # Add the reason for fallback
-                    return jsonify(fallback_result), 200
+                payload, status = _attempt_fallback(
+                    circuit_data, simulator_choice_key, shots, precision, top_k, provider_key,
+                    failure_summary=f"Original execution on '{provider_key}' failed: {result['error']}",
+                    reason=result["error"],
+                    original_backend_used=result.get("backend_used", "None") # Show original backend if available
+                )
+                return _result_response(payload, status)
             else:
                 # Primary execution (QPU without fallback, or simulator) failed
                 return jsonify({"error": result["error"], "backend_used": result.get("backend_used", "None")}), 500
         
         # Primary execution succeeded
-        return jsonify(result), 200
+        return _result_response(result)
 
     except ValueError as e:
         # Catch specific validation errors (e.g., malformed circuit, unsupported gate, or credential issues from runner)
         error_message = str(e)
-        if "credentials" in error_message.lower() or "token" in error_message.lower() or "access key" in error_message.lower() or "connection" in error_message.lower() or "authentication" in error_message.lower():
+        if _CREDENTIAL_ERROR_RE.search(error_message):
             if is_qpu and use_simulator_if_qpu_fails:
                 app.logger.warning(f"QPU execution failed due to credentials for '{provider_key}': {error_message}. Falling back to {simulator_choice_key}.")
-                
-                fallback_backend_info = BACKEND_MAP.get(simulator_choice_key)
-                if not fallback_backend_info or fallback_backend_info["provider_type"] == "qpu":
-                    return jsonify({
-                        "error": f"Original execution on '{provider_key}' failed due to credentials: {error_message}. "
-                                 f"Invalid fallback simulator choice: {simulator_choice_key}. Cannot proceed.",
-                        "backend_used": provider_key # Keep original backend as used for error context
-                    }), 500
-                
-                fallback_runner = fallback_backend_info["runner"]
-                fallback_backend_name = fallback_backend_info["backend_name"]
-                fallback_provider_name = fallback_backend_info["provider"]
-                
-                fallback_credentials = _get_credentials_for_provider(fallback_provider_name)
-                fallback_credentials["backend_name"] = fallback_backend_name
-                fallback_credentials["shots"] = shots
-                fallback_credentials["simulator_choice"] = simulator_choice_key
-
-                fallback_result = fallback_runner(circuit_data, fallback_credentials)
-                
-                if fallback_result and "error" in fallback_result:
-                    return jsonify({
-                        "error": f"Original execution on '{provider_key}' failed due to credentials: {error_message}. "
-                                 f"Fallback to '{fallback_backend_name}' also failed: {fallback_result['error']}",
-                        "backend_used": fallback_result.get("backend_used", "None"),
-                        "original_backend_attempted": provider_key,
-                        "fallback_reason": error_message # Reason for original failure
-                    }), 500
-                else:
-                    fallback_result["backend_used"] = f"FALLBACK: {fallback_result['backend_used']} (original target: {provider_key})"
-                    fallback_result["original_backend_attempted"] = provider_key
-                    fallback_result["fallback_reason"] = error_message
-                    return jsonify(fallback_result), 200
+                payload, status = _attempt_fallback(
+                    circuit_data, simulator_choice_key, shots, precision, top_k, provider_key,
+                    failure_summary=f"Original execution on '{provider_key}' failed due to credentials: {error_message}",
+                    reason=error_message,
+                    original_backend_used=provider_key # Keep original backend as used for error context
+                )
+                return _result_response(payload, status)
             else:
                 # QPU failed due to credentials, no fallback or fallback not allowed
                 return jsonify({"error": f"Credential error for {provider_key}: {error_message}", "backend_used": provider_key}), 401
@@ -237,21 +411,85 @@ def run_circuit():
         app.logger.error(f"An unexpected error occurred: {e}\n{traceback.format_exc()}")
         return jsonify({"error": f"An unexpected error occurred: {e}", "backend_used": provider_key}), 500
 
+# Runs the circuits of a /run_batch request concurrently for backends without a batch API.
+# Runners mostly wait on the network (cloud providers) or on native simulator code, so threads suffice.
+_BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="run_batch")
+atexit.register(_BATCH_EXECUTOR.shutdown, wait=False)
+
+def _run_single_in_batch(runner_function, circuit_data: dict, credentials: dict) -> dict:
+    # One failing circuit must not fail the whole batch, so errors are reported per circuit
+    try:
+        return runner_function(circuit_data, dict(credentials))
+    except Exception as e:
+        return {"error": str(e), "backend_used": credentials.get("backend_name", "N/A")}
+
+
+@app.route('/run_batch', methods=['POST'])
+def run_circuit_batch():
+    """
+    Runs several circuits on one backend in a single request.
+    Backends with a batch API (Aer) receive all circuits as one job; for the others the
+    circuits are submitted concurrently. Returns one result dict per circuit, in order.
+    """
+    try:
+        batch_request = msgspec.json.decode(request.get_data(), type=RunBatchRequest)
+    except msgspec.DecodeError as e:
+        return jsonify({"error": f"Invalid request payload: {e}"}), 400
+
+    provider_key = batch_request.provider
+    if not provider_key or not batch_request.circuits:
+        return jsonify({"error": "Missing 'provider' or 'circuits' in payload"}), 400
+
+    selected_backend_info = BACKEND_MAP.get(provider_key)
+    if not selected_backend_info:
+        return jsonify({"error": f"Unsupported provider: {provider_key}"}), 400
+
+    circuits = [circuit_to_dict(circuit) for circuit in batch_request.circuits]
+
+    credentials = {
+        **_get_credentials_for_provider(selected_backend_info["provider"]),
+        "backend_name": selected_backend_info["backend_name"],
+        "shots": batch_request.shots,
+        "simulator_choice": batch_request.simulator_choice,
+        "precision": batch_request.precision,
+        "top_k": batch_request.top_k,
+    }
+
+    try:
+        batch_runner = selected_backend_info.get("batch_runner")
+        if batch_runner is not None:
+            results = batch_runner(circuits, credentials)
+        else:
+            runner_function = selected_backend_info["runner"]
+            results = list(_BATCH_EXECUTOR.map(lambda cd: _run_single_in_batch(runner_function, cd, credentials), circuits))
+        return _result_response({"results": results, "backend_used": selected_backend_info["backend_name"]})
+    except Exception as e:
+        app.logger.error(f"An unexpected error occurred during batch execution: {e}\n{traceback.format_exc()}")
+        return jsonify({"error": f"An unexpected error occurred: {e}", "backend_used": provider_key}), 500
+
 @app.route('/save_credentials', methods=['POST'])
 def save_credentials():
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "Invalid JSON payload"}), 400
+    try:
+        data = msgspec.json.decode(request.get_data(), type=SaveCredentialsRequest)
+    except msgspec.DecodeError as e:
+        return jsonify({"error": f"Invalid request payload: {e}"}), 400
 
-    provider = data.get('provider')
-    credentials = data.get('credentials')
+    provider = data.provider
+    credentials = data.credentials
 
     if not provider or not credentials:
         return jsonify({"error": "Missing 'provider' or 'credentials' in payload"}), 400
 
     try:
         # Store credentials in the in-memory store
-        _in_memory_credentials_store[provider] = credentials
+        if _redis_client is not None:
+            if not _redis_set(f"credentials:{provider}", credentials, _REDIS_CREDENTIALS_TTL):
+                return jsonify({"error": "Failed to save credentials to the shared store."}), 500
+            print(f"Credentials for {provider} stored in Redis.")
+            return jsonify({"message": f"Credentials for {provider} saved successfully (shared store)."}), 200
+
+        with _in_memory_credentials_lock:
+            _in_memory_credentials_store[provider] = MappingProxyType(dict(credentials))
         
         print(f"Credentials for {provider} stored in memory.")
         return jsonify({"message": f"Credentials for {provider} saved successfully (in memory)."}), 200
@@ -261,11 +499,40 @@ def save_credentials():
 
 # --- Gemini API Endpoints ---
 
+def _relay_gemini_stream(response):
+    """
+    Generator that re-emits a Gemini streamGenerateContent (alt=sse) reply as server-sent events.
+    Each event carries {"response": <text chunk>}; the stream ends with a "[DONE]" event.
+    """
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            chunk = msgspec.json.decode(line[5:])
+            candidates = chunk.get('candidates')
+            if not candidates:
+                continue
+            parts = candidates[0].get('content', {}).get('parts', [])
+            text = "".join(part.get('text', "") for part in parts)
+            if text:
+                yield f"data: {msgspec.json.encode({'response': text}).decode()}\n\n"
+        yield "data: [DONE]\n\n"
+    except (requests.exceptions.RequestException, ValueError) as e:
+        app.logger.error(f"Error while streaming Gemini chat response: {e}\n{traceback.format_exc()}")
+        yield f"data: {msgspec.json.encode({'error': f'Gemini stream interrupted: {e}'}).decode()}\n\n"
+    finally:
+        response.close()
+
+
+# Instruction message sent ahead of every chat history. Built once; it is only ever serialized.
+_CHAT_SYSTEM_MESSAGE = {"role": "user", "parts": [{"text": "You are a helpful quantum computing expert. Answer questions about quantum computing, quantum mechanics, and quantum algorithms concisely and accurately."}]}
+
 @app.route('/chat', methods=['POST'])
 def chat_with_quantum_chatbot():
     """
     Endpoint for the quantum computing chatbot.
     Receives a user message and sends it to Gemini API for a response.
+    If the payload sets "stream": true, the reply is relayed as server-sent events.
     """
     if not GEMINI_API_KEY:
         return jsonify({"error": "Gemini API key not configured on the server."}), 500
@@ -280,12 +547,13 @@ def chat_with_quantum_chatbot():
     # Prepare messages for Gemini API
     # Gemini API expects 'contents' as a list of dictionaries with 'role' and 'parts'
     # Each 'part' is a dictionary with 'text'
-    gemini_messages = [{"role": "user", "parts": [{"text": "You are a helpful quantum computing expert. Answer questions about quantum computing, quantum mechanics, and quantum algorithms concisely and accurately."}]}]
-    for chat_item in chat_history:
+    gemini_messages = [
+        _CHAT_SYSTEM_MESSAGE,
         # Map 'assistant' to 'model' for Gemini API
-        role = "model" if chat_item["role"] == "assistant" else chat_item["role"]
-        gemini_messages.append({"role": role, "parts": [{"text": chat_item["content"]}]})
-    gemini_messages.append({"role": "user", "parts": [{"text": user_message}]})
+        *({"role": "model" if chat_item["role"] == "assistant" else chat_item["role"], "parts": [{"text": chat_item["content"]}]}
+          for chat_item in chat_history),
+        {"role": "user", "parts": [{"text": user_message}]},
+    ]
 
     try:
         headers = {
@@ -299,11 +567,18 @@ def chat_with_quantum_chatbot():
             }
         }
         
+        if data.get('stream'):
+            # Relay tokens to the browser as Gemini produces them instead of waiting for the full reply
+            response = _GEMINI_SESSION.post(f"{GEMINI_STREAM_API_URL}?alt=sse&key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=GEMINI_TIMEOUT, stream=True)
+            response.raise_for_status()
+            return Response(stream_with_context(_relay_gemini_stream(response)), mimetype='text/event-stream',
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
         # Include API key directly in the URL for Gemini
-        response = requests.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", headers=headers, json=payload)
+        response = _GEMINI_SESSION.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=GEMINI_TIMEOUT)
         response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
         
-        gemini_response = response.json()
+        gemini_response = msgspec.json.decode(response.content)
         
         if gemini_response and gemini_response.get('candidates'):
             # Extract the text from the first candidate's first part
@@ -321,6 +596,22 @@ def chat_with_quantum_chatbot():
         return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
 
 
+def _describe_circuit(circuit_data: dict) -> str:
+    """
+    Renders circuit data as a readable gate list for Gemini prompts.
+    Lines are collected and joined once rather than concatenated in a loop.
+    """
+    parts = ["Current quantum circuit:\n"]
+    if not circuit_data.get('gates'):
+        parts.append("The circuit is empty.")
+    else:
+        for gate in circuit_data['gates']:
+            qubits_str = f"qubits {gate['qubits']}" if gate.get('qubits') else ""
+            params_str = f" with parameters {gate['parameters']}" if gate.get('parameters') else ""
+            parts.append(f"- Gate: {gate['name']} {qubits_str}{params_str}\n")
+    return "".join(parts)
+
+
 @app.route('/suggest_gates', methods=['POST'])
 def suggest_gates():
     """
@@ -337,17 +628,17 @@ def suggest_gates():
     if not circuit_data:
         return jsonify({"error": "Missing 'circuit' data in payload"}), 400
 
+    cache_key = _gemini_cache_key("suggest_gates", [circuit_data, num_qubits])
+    etag = _etag_for(cache_key)
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    cached = _gemini_cache_get(cache_key)
+    if cached is not None:
+        return _conditional_response(cached, etag), 200
+
     # Convert circuit data to a more readable string for the LLM
-    circuit_description = "Current quantum circuit:\n"
-    if not circuit_data.get('gates'):
-        circuit_description += "The circuit is empty."
-    else:
-        for gate in circuit_data['gates']:
-            qubits_str = f"qubits {gate['qubits']}" if gate.get('qubits') else ""
-            params_str = f" with parameters {gate['parameters']}" if gate.get('parameters') else ""
-            circuit_description += f"- Gate: {gate['name']} {qubits_str}{params_str}\n"
-    
-    circuit_description += f"\nNumber of qubits in circuit: {num_qubits}"
+    circuit_description = _describe_circuit(circuit_data) + f"\nNumber of qubits in circuit: {num_qubits}"
 
     prompt = f"""
     Given the following quantum circuit, suggest up to 4 relevant next quantum gates to add. 
@@ -410,21 +701,22 @@ def suggest_gates():
             }
         }
         
-        response = requests.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", headers=headers, json=payload)
+        response = _GEMINI_SESSION.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=GEMINI_TIMEOUT)
         response.raise_for_status()
         
-        gemini_response = response.json()
+        gemini_response = msgspec.json.decode(response.content)
         
         if gemini_response and gemini_response.get('candidates'):
             try:
                 suggestions_json_str = gemini_response['candidates'][0]['content']['parts'][0]['text']
-                suggestions = json.loads(suggestions_json_str)
-                if isinstance(suggestions, list):
-                    return jsonify({"suggestions": suggestions}), 200
-                else:
-                    app.logger.error(f"Gemini API returned invalid JSON structure for suggestions: {suggestions_json_str}")
-                    return jsonify({"error": "Gemini API returned invalid suggestion format."}), 500
-            except json.JSONDecodeError:
+                # Decoding into typed structs also validates the items against the expected schema
+                suggestions = msgspec.to_builtins(msgspec.json.decode(suggestions_json_str, type=list[GateSuggestion]))
+                _gemini_cache_put(cache_key, {"suggestions": suggestions})
+                return _conditional_response({"suggestions": suggestions}, etag), 200
+            except msgspec.ValidationError as e:
+                app.logger.error(f"Gemini API returned invalid JSON structure for suggestions: {e}: {suggestions_json_str}")
+                return jsonify({"error": "Gemini API returned invalid suggestion format."}), 500
+            except msgspec.DecodeError:
                 app.logger.error(f"Gemini API returned non-JSON content for suggestions: {gemini_response['candidates'][0]['content']['parts'][0]['text']}")
                 return jsonify({"error": "Gemini API did not return valid JSON for suggestions."}), 500
         else:
@@ -454,14 +746,16 @@ def fix_circuit():
     if not circuit_data:
         return jsonify({"error": "Missing 'circuit' data in payload"}), 400
 
-    circuit_description = "Current quantum circuit:\n"
-    if not circuit_data.get('gates'):
-        circuit_description += "The circuit is empty."
-    else:
-        for gate in circuit_data['gates']:
-            qubits_str = f"qubits {gate['qubits']}" if gate.get('qubits') else ""
-            params_str = f" with parameters {gate['parameters']}" if gate.get('parameters') else ""
-            circuit_description += f"- Gate: {gate['name']} {qubits_str}{params_str}\n"
+    cache_key = _gemini_cache_key("fix_circuit", circuit_data)
+    etag = _etag_for(cache_key)
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    cached = _gemini_cache_get(cache_key)
+    if cached is not None:
+        return _conditional_response(cached, etag), 200
+
+    circuit_description = _describe_circuit(circuit_data)
 
     prompt = f"""
     Analyze the following quantum circuit for potential issues, inefficiencies, or opportunities for optimization.
@@ -535,21 +829,22 @@ def fix_circuit():
             }
         }
         
-        response = requests.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", headers=headers, json=payload)
+        response = _GEMINI_SESSION.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=GEMINI_TIMEOUT)
         response.raise_for_status()
         
-        gemini_response = response.json()
+        gemini_response = msgspec.json.decode(response.content)
         
         if gemini_response and gemini_response.get('candidates'):
             try:
                 findings_json_str = gemini_response['candidates'][0]['content']['parts'][0]['text']
-                findings = json.loads(findings_json_str)
-                if isinstance(findings, list):
-                    return jsonify({"findings": findings}), 200
-                else:
-                    app.logger.error(f"Gemini API returned invalid JSON structure for findings: {findings_json_str}")
-                    return jsonify({"error": "Gemini API returned invalid circuit fixer format."}), 500
-            except json.JSONDecodeError:
+                # Decoding into typed structs also validates the items against the expected schema
+                findings = msgspec.to_builtins(msgspec.json.decode(findings_json_str, type=list[CircuitFinding]))
+                _gemini_cache_put(cache_key, {"findings": findings})
+                return _conditional_response({"findings": findings}, etag), 200
+            except msgspec.ValidationError as e:
+                app.logger.error(f"Gemini API returned invalid JSON structure for findings: {e}: {findings_json_str}")
+                return jsonify({"error": "Gemini API returned invalid circuit fixer format."}), 500
+            except msgspec.DecodeError:
                 app.logger.error(f"Gemini API returned non-JSON content for circuit fixer: {gemini_response['candidates'][0]['content']['parts'][0]['text']}")
                 return jsonify({"error": "Gemini API did not return valid JSON for circuit fixer."}), 500
         else:
@@ -563,130 +858,193 @@ def fix_circuit():
         app.logger.error(f"An unexpected error occurred during circuit fixer processing: {e}\n{traceback.format_exc()}")
         return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
 
+# Transpile jobs submitted with "async": true, by job id. Finished results are kept until polled;
+# the oldest entries are dropped once the table is full.
+_TRANSPILE_JOBS_SIZE = 256
+_TRANSPILE_JOBS = OrderedDict()
+_TRANSPILE_JOBS_LOCK = threading.Lock()
+
+# Successful transpile responses by (circuit hash, target backend). Resubmitting an unchanged
+# circuit from the UI then returns without another round of transpilation.
+_TRANSPILE_RESULT_CACHE_SIZE = 256
+_TRANSPILE_RESULT_CACHE = OrderedDict()
+_TRANSPILE_RESULT_CACHE_LOCK = threading.Lock()
+
+def _transpile_cache_key(circuit_data: dict, target_backend_name: str, num_qubits: int, optimization_level,
+                         include_qasm: bool, full_optimization: bool) -> tuple:
+    canonical = json.dumps([circuit_data, num_qubits], sort_keys=True, default=str)
+    return (hashlib.blake2b(canonical.encode(), digest_size=16).digest(), target_backend_name, optimization_level,
+            include_qasm, full_optimization)
+
+def _store_transpile_result(cache_key, future):
+    # Done-callback of a transpile job; only successful results are cached
+    if future.cancelled() or future.exception() is not None:
+        return
+    payload, status = future.result()
+    if status != 200:
+        return
+    with _TRANSPILE_RESULT_CACHE_LOCK:
+        _TRANSPILE_RESULT_CACHE[cache_key] = payload
+        if len(_TRANSPILE_RESULT_CACHE) > _TRANSPILE_RESULT_CACHE_SIZE:
+            _TRANSPILE_RESULT_CACHE.popitem(last=False)
+
+def _transpile_circuit_batch(data: TranspileRequest):
+    # Each circuit is a separate pool job, so a batch spreads over all worker processes.
+    # Cached circuits are answered directly, and new results are cached per circuit.
+    results = [None] * len(data.circuits)
+    pending = []
+    for index, circuit in enumerate(data.circuits):
+        circuit_data = circuit_to_dict(circuit)
+        cache_key = _transpile_cache_key(circuit_data, data.target_backend_name, data.num_qubits,
+                                         data.optimization_level, data.include_qasm, data.full_optimization)
+        with _TRANSPILE_RESULT_CACHE_LOCK:
+            results[index] = _TRANSPILE_RESULT_CACHE.get(cache_key)
+        if results[index] is None:
+            future = get_transpile_pool().submit(transpile_for_backend, circuit_data, data.target_backend_name,
+                                                 data.num_qubits, data.optimization_level, data.include_qasm,
+                                                 data.full_optimization)
+            future.add_done_callback(functools.partial(_store_transpile_result, cache_key))
+            pending.append((index, future))
+
+    try:
+        for index, future in pending:
+            payload, status = future.result()
+            if status != 200:
+                return jsonify(payload), status # e.g. unsupported target, the same for every circuit
+            results[index] = payload
+        return jsonify({"results": results}), 200
+    except Exception as e:
+        app.logger.error(f"Error during batch circuit transpilation: {e}\n{traceback.format_exc()}")
+        return jsonify({"error": f"Failed to transpile circuits: {e}"}), 500
+
 # --- New Transpiler Endpoint ---
 @app.route('/transpile_circuit', methods=['POST'])
 def transpile_circuit():
     """
     Endpoint for transpiling a quantum circuit for a target backend.
-    Receives current circuit data and target backend name.
+    Receives current circuit data and target backend name, plus an optional
+    "optimization_level" (0-3). Without it, Aer simulator targets skip transpile() and only
+    get their single-qubit gate runs fused; "full_optimization": true asks for level 3 instead.
+    "include_qasm": false skips the QASM export when only the gate count/depth metrics are needed.
+    Transpilation runs in a worker process. If the payload sets "async": true, the endpoint
+    answers 202 with a job id right away; poll /transpile_result/<job_id> for the result.
+    A "circuits" list instead of "circuit" transpiles all of them across the worker pool and
+    returns {"results": [...]} in order (synchronous only).
     """
-    data = request.get_json()
-    circuit_data = data.get('circuit')
-    target_backend_name = data.get('target_backend_name')
-    num_qubits = data.get('num_qubits')
-
-    if not circuit_data or not target_backend_name or num_qubits is None:
-        return jsonify({"error": "Missing 'circuit', 'target_backend_name', or 'num_qubits' in payload"}), 400
-
     try:
-        # --- 1. Convert Frontend Circuit to Qiskit QuantumCircuit ---
-        # Initialize with qubits and classical bits for measurement (num_qubits for classical bits)
-        qiskit_circuit = QuantumCircuit(num_qubits, num_qubits) 
-
-        for gate in circuit_data.get('gates', []):
-            gate_name = gate['name'].lower()
-            qubits = gate.get('qubits', [])
-            parameters = gate.get('parameters', [])
-
-            # Map your frontend gate names to Qiskit gate methods
-            # Ensure qubits are valid indices before applying
-            if not qubits or any(q >= num_qubits for q in qubits):
-                app.logger.warning(f"Skipping gate '{gate_name}' due to invalid qubit index: {qubits}")
-                continue
-
-            if gate_name == 'h':
-                qiskit_circuit.h(qubits[0])
-            elif gate_name == 'x':
-                qiskit_circuit.x(qubits[0])
-            elif gate_name == 'y':
-                qiskit_circuit.y(qubits[0])
-            elif gate_name == 'z':
-                qiskit_circuit.z(qubits[0])
-            elif gate_name == 's':
-                qiskit_circuit.s(qubits[0])
-            elif gate_name == 'sdg':
-                qiskit_circuit.sdg(qubits[0])
-            elif gate_name == 't':
-                qiskit_circuit.t(qubits[0])
-            elif gate_name == 'tdg':
-                qiskit_circuit.tdg(qubits[0])
-            elif gate_name == 'rx':
-                if parameters: qiskit_circuit.rx(parameters[0], qubits[0])
-            elif gate_name == 'ry':
-                if parameters: qiskit_circuit.ry(parameters[0], qubits[0])
-            elif gate_name == 'rz':
-                if parameters: qiskit_circuit.rz(parameters[0], qubits[0])
-            elif gate_name == 'u3': # Example for U3, assuming 3 parameters
-                if parameters and len(parameters) == 3: qiskit_circuit.u(parameters[0], parameters[1], parameters[2], qubits[0])
-            elif gate_name == 'cx':
-                if len(qubits) == 2: qiskit_circuit.cx(qubits[0], qubits[1])
-            elif gate_name == 'cy':
-                if len(qubits) == 2: qiskit_circuit.cy(qubits[0], qubits[1])
-            elif gate_name == 'cz':
-                if len(qubits) == 2: qiskit_circuit.cz(qubits[0], qubits[1])
-            elif gate_name == 'swap':
-                if len(qubits) == 2: qiskit_circuit.swap(qubits[0], qubits[1])
-            elif gate_name == 'ccx': # Toffoli
-                if len(qubits) == 3: qiskit_circuit.ccx(qubits[0], qubits[1], qubits[2])
-            elif gate_name == 'measure':
-                if len(qubits) > 0:
-                    # Measure qubit[0] into classical bit[0] (assuming 1-to-1 mapping for simplicity)
-                    qiskit_circuit.measure(qubits[0], qubits[0]) 
-            # Add more gate mappings as needed for your supported gates
-            else:
-                app.logger.warning(f"Unsupported gate type encountered during Qiskit conversion: {gate_name}")
-                # You might want to raise an error or skip the gate
-
-        # --- 2. Select Target Backend for Transpilation ---
-        target_qiskit_backend = None
-        if target_backend_name == "aer_qasm_simulator":
-            target_qiskit_backend = AerSimulator()
-        elif target_backend_name == "aer_statevector_simulator":
-            target_qiskit_backend = AerSimulator(method='statevector') # Or specific Aer method
-        # Add more backend mappings here if you introduce fake backends
-        # elif target_backend_name == "fake_lima":
-        #    target_qiskit_backend = FakeLima()
-        # elif target_backend_name == "fake_manhattan":
-        #    target_qiskit_backend = FakeManhattan()
-        else:
-            return jsonify({"error": f"Unsupported target backend for transpilation: {target_backend_name}"}), 400
+        data = msgspec.json.decode(request.get_data(), type=TranspileRequest)
+    except msgspec.DecodeError as e:
+        return jsonify({"error": f"Invalid request payload: {e}"}), 400
 
+    target_backend_name = data.target_backend_name
+    num_qubits = data.num_qubits
 
-        # --- 3. Transpile the Circuit ---
-        # optimization_level: 0 (no optimization) to 3 (heavy optimization)
-        transpiled_circuit = transpile(qiskit_circuit, target_qiskit_backend, optimization_level=3)
+    if (data.circuit is None and not data.circuits) or not target_backend_name or num_qubits is None:
+        return jsonify({"error": "Missing 'circuit', 'target_backend_name', or 'num_qubits' in payload"}), 400
+    optimization_level = data.optimization_level
+    if optimization_level is not None and not 0 <= optimization_level <= 3:
+        return jsonify({"error": "'optimization_level' must be between 0 and 3"}), 400
+    if data.circuits:
+        if data.run_async:
+            return jsonify({"error": "'async' is not supported for a 'circuits' batch"}), 400
+        return _transpile_circuit_batch(data)
+
+    circuit_data = circuit_to_dict(data.circuit)
+
+    cache_key = _transpile_cache_key(circuit_data, target_backend_name, num_qubits, optimization_level,
+                                    data.include_qasm, data.full_optimization)
+    etag = _etag_for(cache_key)
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    with _TRANSPILE_RESULT_CACHE_LOCK:
+        cached = _TRANSPILE_RESULT_CACHE.get(cache_key)
+        if cached is not None:
+            _TRANSPILE_RESULT_CACHE.move_to_end(cache_key)
+    if cached is not None:
+        return _conditional_response(cached, etag), 200 # Also for async requests: the result is already available
 
-        # --- 4. Get Metrics ---
-        original_gate_count = qiskit_circuit.size()
-        transpiled_gate_count = transpiled_circuit.size()
-        original_depth = qiskit_circuit.depth()
-        transpiled_depth = transpiled_circuit.depth()
+    try:
+        future = get_transpile_pool().submit(transpile_for_backend, circuit_data, target_backend_name, num_qubits,
+                                             optimization_level, data.include_qasm, data.full_optimization)
+        future.add_done_callback(functools.partial(_store_transpile_result, cache_key))
+
+        if data.run_async:
+            job_id = uuid.uuid4().hex
+            with _TRANSPILE_JOBS_LOCK:
+                _TRANSPILE_JOBS[job_id] = future
+                if len(_TRANSPILE_JOBS) > _TRANSPILE_JOBS_SIZE:
+                    _TRANSPILE_JOBS.popitem(last=False)
+            return jsonify({"job_id": job_id, "status": "running", "status_url": f"/transpile_result/{job_id}"}), 202
+
+        payload, status = future.result()
+        if status == 200:
+            return _conditional_response(payload, etag), 200
+        return jsonify(payload), status
 
-        # --- 5. Get QASM string of the transpiled circuit ---
-        transpiled_qasm_code = transpiled_circuit.qasm()
+    except Exception as e:
+        app.logger.error(f"Error during circuit transpilation: {e}\n{traceback.format_exc()}")
+        return jsonify({"error": f"Failed to transpile circuit: {e}"}), 500
 
-        return jsonify({
-            "transpiled_circuit_qasm": transpiled_qasm_code, # New field for QASM code
-            "original_gate_count": original_gate_count,
-            "transpiled_gate_count": transpiled_gate_count,
-            "original_depth": original_depth,
-            "transpiled_depth": transpiled_depth,
-            "message": "Circuit transpiled successfully!"
-        }), 200
+@app.route('/transpile_result/<job_id>', methods=['GET'])
+def transpile_result(job_id):
+    """
+    Returns the result of an async transpile job, or 202 while it is still running.
+    """
+    with _TRANSPILE_JOBS_LOCK:
+        future = _TRANSPILE_JOBS.get(job_id)
+        if future is None:
+            return jsonify({"error": f"Unknown transpile job: {job_id}"}), 404
+        if not future.done():
+            return jsonify({"job_id": job_id, "status": "running"}), 202
+        del _TRANSPILE_JOBS[job_id]
 
+    try:
+        payload, status = future.result()
+        return jsonify(payload), status
     except Exception as e:
         app.logger.error(f"Error during circuit transpilation: {e}\n{traceback.format_exc()}")
         return jsonify({"error": f"Failed to transpile circuit: {e}"}), 500
 
+def warm_backends():
+    """
+    Runs a one-qubit circuit through the local simulators and starts the transpile workers,
+    so the first user request does not pay for Qiskit/Aer, Cirq and PennyLane start-up.
+    Failures are only reported; the affected backend then warms up on its first request.
+    """
+    warmup_circuit = {"qubits": 1, "gates": [{"gate": "h", "target": 0}, {"gate": "measure", "target": 0}]}
+    warmup_runs = (
+        (run_aer, {"backend_name": "aer_qasm_simulator", "simulator_choice": "aer_qasm_simulator", "shots": 1}),
+        (run_aer, {"backend_name": "aer_statevector_simulator", "simulator_choice": "aer_statevector_simulator"}),
+        (run_cirq, {"backend_name": "cirq_simulator", "shots": 1}),
+        (run_pennylane, {"backend_name": "lightning.qubit", "shots": 1}),
+    )
+    for runner_function, credentials in warmup_runs:
+        try:
+            result = runner_function(warmup_circuit, credentials)
+            if result and "error" in result:
+                print(f"Warning: Warm-up of {credentials['backend_name']} failed: {result['error']}")
+        except Exception as e:
+            print(f"Warning: Warm-up of {credentials['backend_name']} failed: {e}")
+    try:
+        # Spawns the worker processes, which build their transpile targets in the pool initializer
+        get_transpile_pool().submit(int).result()
+    except Exception as e:
+        print(f"Warning: Could not start the transpile worker pool: {e}")
+
 # Register a function to be called when the application is exiting
 @atexit.register
 def cleanup_on_exit():
     print("Clearing in-memory credentials store on application exit.")
-    _in_memory_credentials_store.clear()
+    with _in_memory_credentials_lock:
+        _in_memory_credentials_store.clear()
 
 if __name__ == '__main__':
     # Ensure the GEMINI_API_KEY is set in your environment or a .env file
     if not GEMINI_API_KEY:
         print("WARNING: GEMINI_API_KEY environment variable is not set. AI features will not work.")
         print("Please create a .env file in the same directory as app.py with: GEMINI_API_KEY=YOUR_API_KEY")
+    # With debug=True the reloader re-runs this file in a child process; only that one serves requests
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_backends()
     app.run(debug=True, port=5000)
@@ -1,61 +1,73 @@
 # cirq_backend.py
+import functools
+
 import cirq
 import numpy as np
 
+from fast_statevector import simulate_statevector
+
 # pip install cirq
 
+# The simulator is stateless between runs, so one instance is built at import and reused
+_SIMULATOR = cirq.Simulator()
+
+def _cirq_ccx(qubits, gate_info):
+    controls = [qubits[c] for c in gate_info["controls"]]
+    if len(controls) != 2:
+        raise ValueError(f"CCX gate requires exactly 2 control qubits, got {len(controls)}")
+    return cirq.CCNOT(controls[0], controls[1], qubits[gate_info["target"]])
+
+# Gate objects shared by every circuit: inverse phase gates are built once, and rotation gates
+# are cached per angle, so repeated circuits (e.g. parameter sweeps) reuse them.
+_S_DAG = cirq.S**-1
+_T_DAG = cirq.T**-1
+_rx = functools.lru_cache(maxsize=2048)(cirq.rx)
+_ry = functools.lru_cache(maxsize=2048)(cirq.ry)
+_rz = functools.lru_cache(maxsize=2048)(cirq.rz)
+
+# Lowercased gate name -> builder(qubits, gate_info) returning the Cirq operation.
+# One dict lookup per gate instead of walking an if/elif chain.
+_CIRQ_GATE_BUILDERS = {
+    "h": lambda q, g: cirq.H(q[g["target"]]),
+    "x": lambda q, g: cirq.X(q[g["target"]]),
+    "y": lambda q, g: cirq.Y(q[g["target"]]),
+    "z": lambda q, g: cirq.Z(q[g["target"]]),
+    "s": lambda q, g: cirq.S(q[g["target"]]),
+    "sdg": lambda q, g: _S_DAG(q[g["target"]]),
+    "t": lambda q, g: cirq.T(q[g["target"]]),
+    "tdg": lambda q, g: _T_DAG(q[g["target"]]),
+    "rx": lambda q, g: _rx(g["params"]["theta"]).on(q[g["target"]]),
+    "ry": lambda q, g: _ry(g["params"]["theta"]).on(q[g["target"]]),
+    "rz": lambda q, g: _rz(g["params"]["theta"]).on(q[g["target"]]),
+    "cx": lambda q, g: cirq.CNOT(q[g["control"]], q[g["target"]]),
+    "ccx": _cirq_ccx,
+    # For swap, frontend's "target" and "control" map to the two qubits to swap
+    "swap": lambda q, g: cirq.SWAP(q[g["target"]], q[g["control"]]),
+    # Cirq measurements
+    "measure": lambda q, g: cirq.measure(q[g["target"]], key=f"q{g['target']}"),
+}
+
 def _build_cirq_circuit(circuit_data: dict) -> cirq.Circuit:
     """Builds a Cirq Circuit from the standardized circuit data."""
     num_qubits = circuit_data["qubits"]
     qubits = cirq.LineQubit.range(num_qubits)
-    circuit = cirq.Circuit()
+    ops = []
 
     for gate_info in circuit_data["gates"]:
         gate_type = gate_info["gate"].lower()
-        target = qubits[gate_info["target"]]
-
-        if gate_type == "h":
-            circuit.append(cirq.H(target))
-        elif gate_type == "x":
-            circuit.append(cirq.X(target))
-        elif gate_type == "y":
-            circuit.append(cirq.Y(target))
-        elif gate_type == "z":
-            circuit.append(cirq.Z(target))
-        elif gate_type == "s":
-            circuit.append(cirq.S(target))
-        elif gate_type == "sdg":
-            circuit.append(cirq.S(target)**-1)
-        elif gate_type == "t":
-            circuit.append(cirq.T(target))
-        elif gate_type == "tdg":
-            circuit.append(cirq.T(target)**-1)
-        elif gate_type == "rx":
-            circuit.append(cirq.rx(gate_info["params"]["theta"]).on(target))
-        elif gate_type == "ry":
-            circuit.append(cirq.ry(gate_info["params"]["theta"]).on(target))
-        elif gate_type == "rz":
-            circuit.append(cirq.rz(gate_info["params"]["theta"]).on(target))
-        elif gate_type == "cx":
-            control = qubits[gate_info["control"]]
-            circuit.append(cirq.CNOT(control, target))
-        elif gate_type == "ccx":
-            controls = [qubits[c] for c in gate_info["controls"]]
-            if len(controls) == 2:
-                circuit.append(cirq.CCNOT(controls[0], controls[1], target))
-            else:
-                raise ValueError(f"CCX gate requires exactly 2 control qubits, got {len(controls)}")
-        elif gate_type == "swap":
-            # For swap, frontend's "target" and "control" map to the two qubits to swap
-            q1 = qubits[gate_info["target"]]
-            q2 = qubits[gate_info["control"]] # Assuming control is used for the second qubit in swap
-            circuit.append(cirq.SWAP(q1, q2))
-        elif gate_type == "measure":
-            # Cirq measurements
-            circuit.append(cirq.measure(target, key=f"q{gate_info['target']}"))
-        else:
+        builder = _CIRQ_GATE_BUILDERS.get(gate_type)
+        if builder is None:
             raise ValueError(f"Unsupported gate type for Cirq: {gate_type}")
-    return circuit
+        ops.append(builder(qubits, gate_info))
+    # Build the circuit in one go so moment insertion runs once over all ops, not once per gate
+    return cirq.Circuit(ops, strategy=cirq.InsertStrategy.EARLIEST)
+
+def _statevector_probabilities(statevector: np.ndarray, num_qubits: int) -> dict:
+    # Squared magnitudes computed in NumPy; only basis states with non-negligible
+    # probability get a bitstring label, so sparse states don't pay for all 2^n entries
+    probs = statevector.real**2 + statevector.imag**2
+    nonzero = np.flatnonzero(probs > 1e-12)
+    return {format(int(i), f'0{num_qubits}b'): float(probs[i]) for i in nonzero}
 
 def run_cirq(circuit_data: dict, credentials: dict = None) -> dict:
     """
@@ -72,66 +84,55 @@ def run_cirq(circuit_data: dict, credentials: dict = None) -> dict:
     shots = credentials.get("shots", 1024) if credentials else 1024 # Default shots
 
     try:
-        circuit = _build_cirq_circuit(circuit_data)
-        simulator = cirq.Simulator()
-
         # Check if there are any measurement gates in the circuit
         has_measurements = any(g["gate"].lower() == "measure" for g in circuit_data["gates"])
 
+        if not has_measurements:
+            # Small standard-gate circuits skip building the Cirq circuit entirely
+            statevector = simulate_statevector(circuit_data)
+            if statevector is not None:
+                return {
+                    "backend_used": "Cirq Local Simulator (Statevector)",
+                    "num_qubits": circuit_data["qubits"],
+                    "counts": None,
+                    "statevector": statevector,
+                    "probabilities": _statevector_probabilities(statevector, circuit_data["qubits"])
+                }
+
+        circuit = _build_cirq_circuit(circuit_data)
+        simulator = _SIMULATOR
+
         if has_measurements:
             # Run simulation to get counts
             result = simulator.run(circuit, repetitions=shots)
             
-            # Process counts from measurement results
-            counts = {}
-            # Cirq results are often by key. Combine bits into a single string.
-            for key, val_counts in result.multi_readout_histogram(keys=result.measurements.keys()).items():
-                for bitstring, count in val_counts.items():
-                    # Reconstruct the full bitstring. This can be tricky if not all qubits are measured.
-                    # A robust way is to measure all qubits for counts.
-                    # For simplicity, we assume relevant qubits are measured and reconstruct.
-                    # This assumes measurement keys are 'q0', 'q1', etc.
-                    full_bitstring = ['0'] * circuit_data["qubits"]
-                    for q_idx in range(circuit_data["qubits"]):
-                        q_key = f"q{q_idx}"
-                        if q_key in result.measurements: # Check if this qubit was measured
-                            # Get the measured bit for this qubit for each repetition
-                            # This needs to align `bitstring` with `q_idx` from the histogram.
-                            # The `multi_readout_histogram` maps tuples of bits to counts.
-                            # The order of the bits in the tuple corresponds to the sorted keys passed to it.
-                            
-                            # Re-process to align with typical '00', '01' format
-                            # This is a simplification; for complex measurement setups, more careful mapping is needed.
-                            # A direct way to get counts for all measured qubits:
-                            combined_measurement = "".join(str(bit[0]) for bit in bitstring) # If bitstring is a tuple of tuples
-                            counts[combined_measurement] = counts.get(combined_measurement, 0) + count
-
-            # Statevector and probabilities only if no measurements were performed (or for separate statevector run)
-            statevector = None
-            probabilities = None
-            if not has_measurements: # Only get statevector if no measurement gates are present
-                final_state_vector = simulator.simulate(circuit).final_state_vector
-                statevector = final_state_vector.tolist()
-                probabilities = {
-                    format(i, f'0{circuit_data["qubits"]}b'): abs(amp)**2
-                    for i, amp in enumerate(statevector)
-                }
+            # Process counts from measurement results. Each key ('q0', 'q1', ...) holds a
+            # (shots, 1) array, so stack them in qubit order into a (shots, measured) bit matrix,
+            # pack each row into an integer and histogram the integers. Only the distinct
+            # outcomes are formatted as bitstrings (qubit with the lowest index leftmost).
+            measurement_keys = sorted(result.measurements, key=lambda key: int(key[1:]))
+            bits = np.hstack([result.measurements[key] for key in measurement_keys]).astype(np.uint64)
+            num_measured = bits.shape[1]
+            outcomes = bits @ (np.uint64(1) << np.arange(num_measured - 1, -1, -1, dtype=np.uint64))
+            values, value_counts = np.unique(outcomes, return_counts=True)
+            counts = {
+                format(int(value), f'0{num_measured}b'): int(count)
+                for value, count in zip(values, value_counts)
+            }
 
+            # Measured circuits only report counts; the statevector path below is the only other simulation
             return {
                 "backend_used": "Cirq Local Simulator",
                 "num_qubits": circuit_data["qubits"],
-                "counts": counts if has_measurements else None,
-                "statevector": statevector,
-                "probabilities": probabilities
+                "counts": counts,
+                "statevector": None,
+                "probabilities": None
             }
         else:
             # If no measurements, simulate statevector
-            result = simulator.simulate(circuit)
-            statevector = result.final_state_vector.tolist()
-            probabilities = {
-                format(i, f'0{circuit_data["qubits"]}b'): abs(amp)**2
-                for i, amp in enumerate(statevector)
-            }
+            result = simulator.simulate(circuit, qubit_order=cirq.LineQubit.range(circuit_data["qubits"])) # Include idle qubits
+            statevector = result.final_state_vector # Complex ndarray, encoded by the app's JSON provider
+            probabilities = _statevector_probabilities(result.final_state_vector, circuit_data["qubits"])
             return {
                 "backend_used": "Cirq Local Simulator (Statevector)",
                 "num_qubits": circuit_data["qubits"],
@@ -0,0 +1,137 @@
+# fast_statevector.py
+# Small statevector simulator for the local Cirq runners. For circuits of at most
+# FAST_PATH_MAX_QUBITS qubits built only from the standard gates below, building the Cirq
+# circuit (moments, gate objects, matrix lookups) costs more than the simulation itself, so
+# these circuits are applied directly to a NumPy array with Numba-compiled kernels.
+# Numba comes with amazon-braket-sdk; without it the fast path is disabled and the runners
+# use cirq.Simulator as before.
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+FAST_PATH_MAX_QUBITS = 20
+
+_SQRT1_2 = 1 / np.sqrt(2)
+
+# Lowercased gate name -> 2x2 matrix (fixed gates) or theta -> 2x2 matrix (rotations),
+# with the same conventions as cirq.H, cirq.S, cirq.rx, ...
+_FIXED_GATES = {
+    "h": np.array([[_SQRT1_2, _SQRT1_2], [_SQRT1_2, -_SQRT1_2]], dtype=np.complex128),
+    "x": np.array([[0, 1], [1, 0]], dtype=np.complex128),
+    "y": np.array([[0, -1j], [1j, 0]], dtype=np.complex128),
+    "z": np.array([[1, 0], [0, -1]], dtype=np.complex128),
+    "s": np.array([[1, 0], [0, 1j]], dtype=np.complex128),
+    "sdg": np.array([[1, 0], [0, -1j]], dtype=np.complex128),
+    "t": np.array([[1, 0], [0, np.exp(1j * np.pi / 4)]], dtype=np.complex128),
+    "tdg": np.array([[1, 0], [0, np.exp(-1j * np.pi / 4)]], dtype=np.complex128),
+}
+_ROTATION_GATES = {
+    "rx": lambda theta: np.array([[np.cos(theta / 2), -1j * np.sin(theta / 2)],
+                                  [-1j * np.sin(theta / 2), np.cos(theta / 2)]], dtype=np.complex128),
+    "ry": lambda theta: np.array([[np.cos(theta / 2), -np.sin(theta / 2)],
+                                  [np.sin(theta / 2), np.cos(theta / 2)]], dtype=np.complex128),
+    "rz": lambda theta: np.array([[np.exp(-0.5j * theta), 0], [0, np.exp(0.5j * theta)]], dtype=np.complex128),
+}
+
+if njit is not None:
+    # The state index is big-endian like Cirq's: qubit q is bit (num_qubits - 1 - q) of the index.
+    # Kernels are compiled on first use and cached on disk next to this module.
+    @njit(cache=True, fastmath=True)
+    def _apply_1q(sv, m00, m01, m10, m11, bit):
+        stride = 1 << bit
+        for k in range(0, sv.shape[0], stride << 1):
+            for j in range(stride):
+                i0 = k | j
+                i1 = i0 | stride
+                a = sv[i0]
+                b = sv[i1]
+                sv[i0] = m00 * a + m01 * b
+                sv[i1] = m10 * a + m11 * b
+
+    @njit(cache=True)
+    def _apply_controlled_x(sv, control_mask, bit):
+        # X on `bit` for every basis state whose control bits are all set (CX, CCX)
+        stride = 1 << bit
+        for i in range(sv.shape[0]):
+            if i & stride == 0 and i & control_mask == control_mask:
+                j = i | stride
+                sv[i], sv[j] = sv[j], sv[i]
+
+    @njit(cache=True)
+    def _apply_swap(sv, bit_a, bit_b):
+        mask_a = 1 << bit_a
+        mask_b = 1 << bit_b
+        for i in range(sv.shape[0]):
+            if i & mask_a != 0 and i & mask_b == 0:
+                j = i ^ mask_a ^ mask_b
+                sv[i], sv[j] = sv[j], sv[i]
+
+
+def _to_ops(circuit_data: dict):
+    """
+    Converts circuit_data into (kind, qubits, matrix) tuples, or returns None if any gate is
+    outside the supported set or malformed, so the caller falls back to Cirq (and its errors).
+    Accepts both the Cirq runner's "controls" list and the Google runner's control1/control2 for CCX.
+    """
+    num_qubits = circuit_data.get("qubits")
+    if not isinstance(num_qubits, int) or not 0 < num_qubits <= FAST_PATH_MAX_QUBITS:
+        return None
+
+    ops = []
+    for gate_info in circuit_data.get("gates", []):
+        gate_type = str(gate_info.get("gate", "")).lower()
+        target = gate_info.get("target")
+        if gate_type in _FIXED_GATES:
+            ops.append(("1q", (target,), _FIXED_GATES[gate_type]))
+        elif gate_type in _ROTATION_GATES:
+            theta = gate_info.get("params", {}).get("theta", 0)
+            if not isinstance(theta, (int, float)):
+                return None # Symbolic parameters are left to Cirq
+            ops.append(("1q", (target,), _ROTATION_GATES[gate_type](theta)))
+        elif gate_type == "cx":
+            ops.append(("cx", (gate_info.get("control"), target), None))
+        elif gate_type == "ccx":
+            controls = gate_info.get("controls") or [gate_info.get("control1"), gate_info.get("control2")]
+            if len(controls) != 2:
+                return None
+            ops.append(("cx", (*controls, target), None))
+        elif gate_type == "swap":
+            ops.append(("swap", (target, gate_info.get("control")), None))
+        else:
+            return None # Measurements and unknown gates
+
+        qubits = ops[-1][1]
+        if any(not isinstance(q, int) or not 0 <= q < num_qubits for q in qubits) or len(set(qubits)) != len(qubits):
+            return None
+    return ops
+
+
+def simulate_statevector(circuit_data: dict):
+    """
+    Returns the final complex128 statevector of circuit_data (big-endian, starting from |0...0>),
+    or None if the circuit is not eligible for the fast path.
+    """
+    if njit is None:
+        return None
+    ops = _to_ops(circuit_data)
+    if ops is None:
+        return None
+
+    num_qubits = circuit_data["qubits"]
+    sv = np.zeros(1 << num_qubits, dtype=np.complex128)
+    sv[0] = 1
+    for kind, qubits, matrix in ops:
+        bits = [num_qubits - 1 - q for q in qubits]
+        if kind == "1q":
+            _apply_1q(sv, matrix[0, 0], matrix[0, 1], matrix[1, 0], matrix[1, 1], bits[0])
+        elif kind == "cx":
+            control_mask = 0
+            for bit in bits[:-1]:
+                control_mask |= 1 << bit
+            _apply_controlled_x(sv, control_mask, bits[-1])
+        else:
+            _apply_swap(sv, bits[0], bits[1])
+    return sv
@@ -3,8 +3,65 @@
 # Note: This file is named `google_backend.py` to align with the request,
 # but it uses the Cirq simulator, as Cirq is Google's primary quantum computing framework.
 # No specific "Google Cloud QPU" direct integration without actual credentials.
+import functools
+
 import cirq
-from collections import Counter
+import numpy as np
+
+from fast_statevector import simulate_statevector
+
+def _theta(gate_info: dict):
+    return gate_info.get("params", {}).get("theta", 0)
+
+def _cx(qubits, gate_info, target_qubit, control_qubit):
+    if control_qubit is None:
+        raise ValueError("Control qubit not specified for CX gate.")
+    return cirq.CNOT(control_qubit, target_qubit)
+
+def _ccx(qubits, gate_info, target_qubit, control_qubit):
+    control1 = gate_info.get("control1")
+    control2 = gate_info.get("control2")
+    if control1 is None or control2 is None:
+        raise ValueError("Both control qubits not specified for CCX gate.")
+    return cirq.CCNOT(qubits[control1], qubits[control2], target_qubit)
+
+def _swap(qubits, gate_info, target_qubit, control_qubit):
+    if control_qubit is None:
+        raise ValueError("Second qubit not specified for SWAP gate.")
+    return cirq.SWAP(target_qubit, control_qubit)
+
+# Gate objects shared by every circuit: inverse phase gates are built once, and rotation gates
+# are cached per angle, so repeated circuits (e.g. parameter sweeps) reuse them.
+_S_DAG = cirq.S**-1
+_T_DAG = cirq.T**-1
+_rx = functools.lru_cache(maxsize=2048)(cirq.rx)
+_ry = functools.lru_cache(maxsize=2048)(cirq.ry)
+_rz = functools.lru_cache(maxsize=2048)(cirq.rz)
+
+# Gate name -> builder(qubits, gate_info, target_qubit, control_qubit) returning the Cirq operation.
+# One dict lookup per gate instead of walking an if/elif chain.
+_GATE_BUILDERS = {
+    "H": lambda q, g, t, c: cirq.H(t),
+    "X": lambda q, g, t, c: cirq.X(t),
+    "Y": lambda q, g, t, c: cirq.Y(t),
+    "Z": lambda q, g, t, c: cirq.Z(t),
+    "S": lambda q, g, t, c: cirq.S(t),
+    "SDG": lambda q, g, t, c: _S_DAG(t),
+    "T": lambda q, g, t, c: cirq.T(t),
+    "TDG": lambda q, g, t, c: _T_DAG(t),
+    "RX": lambda q, g, t, c: _rx(_theta(g)).on(t),
+    "RY": lambda q, g, t, c: _ry(_theta(g)).on(t),
+    "RZ": lambda q, g, t, c: _rz(_theta(g)).on(t),
+    "CX": _cx,
+    "CCX": _ccx,
+    "SWAP": _swap,
+    "MEASURE": lambda q, g, t, c: cirq.measure(t, key=f"q{g.get('target')}"),
+}
+
+def _probabilities(final_state: np.ndarray, num_qubits: int) -> dict:
+    # Squared magnitudes in NumPy; only non-negligible basis states get a bitstring label
+    probs = final_state.real**2 + final_state.imag**2
+    return {format(int(i), f'0{num_qubits}b'): float(probs[i]) for i in np.flatnonzero(probs > 1e-12)}
 
 def run_google(circuit_data: dict) -> dict:
     """
@@ -31,8 +88,14 @@ def run_google(circuit_data: dict) -> dict:
     if num_qubits is None:
         raise ValueError("Number of qubits must be specified in circuit_data.")
 
+    if all(gate_info.get("gate") in _GATE_BUILDERS and gate_info.get("gate") != "MEASURE" for gate_info in gates):
+        # Small standard-gate circuits without measurements skip building the Cirq circuit entirely
+        final_state = simulate_statevector(circuit_data)
+        if final_state is not None:
+            return {"statevector": final_state, "probabilities": _probabilities(final_state, num_qubits)}
+
     qubits = cirq.LineQubit.range(num_qubits)
-    circuit = cirq.Circuit()
+    ops = []
 
     measurement_keys = {} # To store mapping from qubit to measurement key
 
@@ -44,51 +107,16 @@ def run_google(circuit_data: dict) -> dict:
         target_qubit = qubits[target] if target is not None else None
         control_qubit = qubits[control] if control is not None else None
 
-        if gate_type == "H":
-            circuit.append(cirq.H(target_qubit))
-        elif gate_type == "X":
-            circuit.append(cirq.X(target_qubit))
-        elif gate_type == "Y":
-            circuit.append(cirq.Y(target_qubit))
-        elif gate_type == "Z":
-            circuit.append(cirq.Z(target_qubit))
-        elif gate_type == "S":
-            circuit.append(cirq.S(target_qubit))
-        elif gate_type == "SDG":
-            circuit.append(cirq.S(target_qubit)**-1)
-        elif gate_type == "T":
-            circuit.append(cirq.T(target_qubit))
-        elif gate_type == "TDG":
-            circuit.append(cirq.T(target_qubit)**-1)
-        elif gate_type == "RX":
-            theta = gate_info.get("params", {}).get("theta", 0)
-            circuit.append(cirq.rx(theta).on(target_qubit))
-        elif gate_type == "RY":
-            theta = gate_info.get("params", {}).get("theta", 0)
-            circuit.append(cirq.ry(theta).on(target_qubit))
-        elif gate_type == "RZ":
-            theta = gate_info.get("params", {}).get("theta", 0)
-            circuit.append(cirq.rz(theta).on(target_qubit))
-        elif gate_type == "CX":
-            if control_qubit is None:
-                raise ValueError(f"Control qubit not specified for {gate_type} gate.")
-            circuit.append(cirq.CNOT(control_qubit, target_qubit))
-        elif gate_type == "CCX":
-            control1 = gate_info.get("control1")
-            control2 = gate_info.get("control2")
-            if control1 is None or control2 is None:
-                raise ValueError(f"Both control qubits not specified for {gate_type} gate.")
-            circuit.append(cirq.CCNOT(qubits[control1], qubits[control2], target_qubit))
-        elif gate_type == "SWAP":
-            if control_qubit is None:
-                raise ValueError(f"Second qubit not specified for {gate_type} gate.")
-            circuit.append(cirq.SWAP(target_qubit, control_qubit))
-        elif gate_type == "MEASURE":
-            key = f"q{target}"
-            circuit.append(cirq.measure(target_qubit, key=key))
-            measurement_keys[target] = key
-        else:
+        builder = _GATE_BUILDERS.get(gate_type)
+        if builder is None:
             print(f"Warning: Unknown gate type {gate_type}. Skipping.")
+            continue
+        ops.append(builder(qubits, gate_info, target_qubit, control_qubit))
+        if gate_type == "MEASURE":
+            measurement_keys[target] = f"q{target}"
+
+    # Build the circuit in one go so moment insertion runs once over all ops, not once per gate
+    circuit = cirq.Circuit(ops, strategy=cirq.InsertStrategy.EARLIEST)
 
     simulator = cirq.Simulator()
     shots = 1024 # Default shots
@@ -97,21 +125,19 @@ def run_google(circuit_data: dict) -> dict:
         result = simulator.run(circuit, repetitions=shots)
         measurements = result.measurements
 
-        combined_results = []
-        sorted_measured_qubits = sorted(measurement_keys.keys())
-        
-        for i in range(shots):
-            bitstring_parts = []
-            for q_idx in sorted_measured_qubits:
-                key = measurement_keys[q_idx]
-                bit = measurements[key][i][0] if isinstance(measurements[key][i], list) else measurements[key][i]
-                bitstring_parts.append(str(bit))
-            combined_results.append("".join(bitstring_parts[::-1]))
-
-        counts = dict(Counter(combined_results))
+        # Stack the (shots, 1) arrays of the measured qubits into a (shots, measured) bit matrix with
+        # the highest qubit index leftmost, pack each row into an integer and histogram the integers.
+        # Only the distinct outcomes are formatted as bitstrings.
+        bits = np.hstack([measurements[measurement_keys[q_idx]] for q_idx in sorted(measurement_keys)])[:, ::-1]
+        num_measured = bits.shape[1]
+        outcomes = bits.astype(np.uint64) @ (np.uint64(1) << np.arange(num_measured - 1, -1, -1, dtype=np.uint64))
+        values, value_counts = np.unique(outcomes, return_counts=True)
+        counts = {format(int(value), f'0{num_measured}b'): int(count) for value, count in zip(values, value_counts)}
         return {"counts": counts}
     else:
-        final_state = simulator.simulate(circuit).final_state_vector
-        probabilities = {bin(i)[2:].zfill(num_qubits): abs(amplitude)**2 for i, amplitude in enumerate(final_state)}
-        statevector = [complex(amp) for amp in final_state]
+        final_state = simulator.simulate(circuit, qubit_order=qubits).final_state_vector
+        probabilities = _probabilities(final_state, num_qubits)
+        # Kept as a complex ndarray; the app's JSON provider encodes it as [real, imag] pairs in one
+        # NumPy pass instead of boxing every amplitude in a Python complex
+        statevector = final_state
         return {"statevector": statevector, "probabilities": probabilities}
\ No newline at end of file
@@ -1,15 +1,59 @@
 # ibm_backend.py
+import functools
 import os
 from dotenv import load_dotenv
-from qiskit import QuantumCircuit, transpile
+from qiskit import transpile
 from qiskit_ibm_runtime import QiskitRuntimeService
 # Corrected import paths for exceptions
 from qiskit_ibm_provider.exceptions import IBMProviderError
 from qiskit_ibm_runtime.exceptions import IBMRuntimeError
 
+from transpiler import build_qiskit_circuit
+
 
 load_dotenv()
 
+# Runtime service and backend handles are cached per token / backend name, so repeat submissions
+# skip the authentication round-trip and the backend metadata fetch. Failed lookups raise and
+# are not cached.
+@functools.lru_cache(maxsize=4)
+def _get_runtime_service(token: str) -> QiskitRuntimeService:
+    return QiskitRuntimeService(token=token)
+
+@functools.lru_cache(maxsize=4)
+def _get_ibm_backend(token: str, backend_name: str):
+    return _get_runtime_service(token).get_backend(backend_name)
+
+def _ccx_qubits(gate_info: dict) -> list:
+    controls = gate_info.get("controls")
+    if controls and len(controls) == 2:
+        return [controls[0], controls[1], gate_info.get("target")]
+    raise ValueError("CCX gate requires exactly 2 control qubits.")
+
+def _theta(gate_info: dict) -> list:
+    return [gate_info.get("params", {}).get("theta", 0)]
+
+# Lowercased gate name -> (qubit list, parameter list) getter, used to convert the run request's
+# gates into the editor format understood by transpiler.build_qiskit_circuit, which builds
+# (and caches) the QuantumCircuit for both the transpile endpoint and IBM submissions.
+_EDITOR_GATE_ARGS = {
+    "h": lambda g: ([g.get("target")], []),
+    "x": lambda g: ([g.get("target")], []),
+    "y": lambda g: ([g.get("target")], []),
+    "z": lambda g: ([g.get("target")], []),
+    "s": lambda g: ([g.get("target")], []),
+    "sdg": lambda g: ([g.get("target")], []),
+    "t": lambda g: ([g.get("target")], []),
+    "tdg": lambda g: ([g.get("target")], []),
+    "rx": lambda g: ([g.get("target")], _theta(g)),
+    "ry": lambda g: ([g.get("target")], _theta(g)),
+    "rz": lambda g: ([g.get("target")], _theta(g)),
+    "cx": lambda g: ([g.get("control"), g.get("target")], []),
+    "ccx": lambda g: (_ccx_qubits(g), []),
+    "swap": lambda g: ([g.get("target"), g.get("control")], []), # Assuming 'control' is the second qubit for swap
+    "measure": lambda g: ([g.get("target")], []), # Measured into the classical bit of the same index
+}
+
 def run_ibm(circuit_data: dict, credentials: dict) -> dict:
     """
     Executes a QASM circuit on an IBM Quantum backend via Qiskit IBM Runtime.
@@ -32,11 +76,11 @@ def run_ibm(circuit_data: dict, credentials: dict) -> dict:
 
         # Initialize QiskitRuntimeService
         # This will attempt to authenticate with the provided token
-        service = QiskitRuntimeService(token=token)
+        service = _get_runtime_service(token)
 
         # Attempt to get the specified backend to verify credentials and connectivity
         try:
-            backend = service.get_backend(backend_name)
+            backend = _get_ibm_backend(token, backend_name)
         except IBMProviderError as e: # Use IBMProviderError for issues related to provider/backend access
             raise ValueError(f"Could not find or connect to IBM backend '{backend_name}'. Error: {e}. Please check backend name and your IBMQ_TOKEN.")
         except IBMRuntimeError as e: # Use IBMRuntimeError for runtime-specific issues
@@ -45,52 +89,17 @@ def run_ibm(circuit_data: dict, credentials: dict) -> dict:
             raise ValueError(f"Failed to connect to IBM Quantum service: {e}")
 
         # Create a quantum circuit from the structured circuit_data
-        circuit = QuantumCircuit(circuit_data["qubits"])
+        editor_gates = []
         for gate_info in circuit_data["gates"]:
             gate_type = gate_info["gate"].lower()
-            target = gate_info.get("target")
-            control = gate_info.get("control")
-            controls = gate_info.get("controls")
-            params = gate_info.get("params", {})
-
-            if gate_type == "h":
-                circuit.h(target)
-            elif gate_type == "x":
-                circuit.x(target)
-            elif gate_type == "y":
-                circuit.y(target)
-            elif gate_type == "z":
-                circuit.z(target)
-            elif gate_type == "s":
-                circuit.s(target)
-            elif gate_type == "sdg":
-                circuit.sdg(target)
-            elif gate_type == "t":
-                circuit.t(target)
-            elif gate_type == "tdg":
-                circuit.tdg(target)
-            elif gate_type == "rx":
-                circuit.rx(params.get("theta", 0), target)
-            elif gate_type == "ry":
-                circuit.ry(params.get("theta", 0), target)
-            elif gate_type == "rz":
-                circuit.rz(params.get("theta", 0), target)
-            elif gate_type == "cx":
-                circuit.cx(control, target)
-            elif gate_type == "ccx":
-                if controls and len(controls) == 2:
-                    circuit.ccx(controls[0], controls[1], target)
-                else:
-                    raise ValueError("CCX gate requires exactly 2 control qubits.")
-            elif gate_type == "swap":
-                circuit.swap(target, control) # Assuming 'control' is the second qubit for swap
-            elif gate_type == "measure":
-                # Add classical bits for measurement if not already present
-                if circuit.num_clbits < circuit.num_qubits:
-                    circuit.add_register(QuantumCircuit.ClassicalRegister(circuit.num_qubits - circuit.num_clbits))
-                circuit.measure(target, target) # Measure target qubit to its corresponding classical bit
-            else:
+            gate_args = _EDITOR_GATE_ARGS.get(gate_type)
+            if gate_args is None:
                 print(f"Warning: Unknown gate type {gate_type} for IBM. Skipping.")
+                continue
+            qubits, parameters = gate_args(gate_info)
+            editor_gates.append({"name": gate_type, "qubits": qubits, "parameters": parameters})
+        # Strict: an invalid gate raises ValueError instead of submitting (and billing) a partial circuit
+        circuit = build_qiskit_circuit({"gates": editor_gates}, circuit_data["qubits"], strict=True)
 
         # Transpile the circuit for the backend
         transpiled_circuit = transpile(circuit, backend)
@@ -2,8 +2,47 @@
 from braket.devices import LocalSimulator
 from braket.aws import AwsDevice
 from braket.circuits import Circuit, Gate, Instruction, ResultType
+import numpy as np
+import functools
 import os
 
+# Local Braket simulator, built once at import and shared by every local run
+_LOCAL_SIMULATOR = LocalSimulator()
+
+# AwsDevice() makes a GetDevice call to Braket, so each device is looked up once per ARN
+# and reused. A failed lookup raises and is not cached.
+@functools.lru_cache(maxsize=None)
+def _get_aws_device(arn: str) -> AwsDevice:
+    return AwsDevice(arn)
+
+def _braket_ccx(circuit: Circuit, gate_info: dict):
+    controls = gate_info.get("controls")
+    if controls and len(controls) == 2:
+        circuit.ccnot(controls[0], controls[1], gate_info["target"])
+    else:
+        raise ValueError("CCX gate requires exactly 2 control qubits.")
+
+# Lowercased gate name -> builder(circuit, gate_info) that appends the gate to the Braket circuit.
+# One dict lookup per gate instead of walking an if/elif chain.
+_BRAKET_GATE_BUILDERS = {
+    "h": lambda c, g: c.h(g["target"]),
+    "x": lambda c, g: c.x(g["target"]),
+    "y": lambda c, g: c.y(g["target"]),
+    "z": lambda c, g: c.z(g["target"]),
+    "s": lambda c, g: c.s(g["target"]),
+    "sdg": lambda c, g: c.sdg(g["target"]),
+    "t": lambda c, g: c.t(g["target"]),
+    "tdg": lambda c, g: c.tdg(g["target"]),
+    "rx": lambda c, g: c.rx(g["target"], g.get("params", {}).get("theta", 0)),
+    "ry": lambda c, g: c.ry(g["target"], g.get("params", {}).get("theta", 0)),
+    "rz": lambda c, g: c.rz(g["target"], g.get("params", {}).get("theta", 0)),
+    "cx": lambda c, g: c.cnot(g.get("control"), g["target"]),
+    "ccx": _braket_ccx,
+    "swap": lambda c, g: c.swap(g["target"], g.get("control")), # Frontend uses target/control, Braket swap is q1, q2
+    # Braket measurements are typically implicit or handled at the end of execution for counts
+    "measure": lambda c, g: None,
+}
+
 def _build_braket_circuit(circuit_data: dict) -> Circuit:
     """Builds an Amazon Braket Circuit from the standardized circuit data."""
     num_qubits = circuit_data["qubits"]
@@ -11,47 +50,10 @@ def _build_braket_circuit(circuit_data: dict) -> Circuit:
 
     for gate_info in circuit_data["gates"]:
         gate_type = gate_info["gate"].lower()
-        target = gate_info["target"]
-        control = gate_info.get("control")
-        controls = gate_info.get("controls")
-        params = gate_info.get("params", {})
-        
-        if gate_type == "h":
-            circuit.h(target)
-        elif gate_type == "x":
-            circuit.x(target)
-        elif gate_type == "y":
-            circuit.y(target)
-        elif gate_type == "z":
-            circuit.z(target)
-        elif gate_type == "s":
-            circuit.s(target)
-        elif gate_type == "sdg":
-            circuit.sdg(target)
-        elif gate_type == "t":
-            circuit.t(target)
-        elif gate_type == "tdg":
-            circuit.tdg(target)
-        elif gate_type == "rx":
-            circuit.rx(target, params.get("theta", 0))
-        elif gate_type == "ry":
-            circuit.ry(target, params.get("theta", 0))
-        elif gate_type == "rz":
-            circuit.rz(target, params.get("theta", 0))
-        elif gate_type == "cx":
-            circuit.cnot(control, target)
-        elif gate_type == "ccx":
-            if controls and len(controls) == 2:
-                circuit.ccnot(controls[0], controls[1], target)
-            else:
-                raise ValueError("CCX gate requires exactly 2 control qubits.")
-        elif gate_type == "swap":
-            circuit.swap(target, control) # Frontend uses target/control, Braket swap is q1, q2
-        elif gate_type == "measure":
-            # Braket measurements are typically implicit or handled at the end of execution for counts
-            pass # Measurement for counts is handled by results, not by adding a gate
-        else:
+        builder = _BRAKET_GATE_BUILDERS.get(gate_type)
+        if builder is None:
             raise ValueError(f"Unsupported gate type for IonQ (Braket): {gate_type}")
+        builder(circuit, gate_info)
     return circuit
 
 def run_ionq(circuit_data: dict, credentials: dict = None) -> dict:
@@ -81,7 +83,7 @@ def run_ionq(circuit_data: dict, credentials: dict = None) -> dict:
         circuit = _build_braket_circuit(circuit_data)
 
         if backend_name == "local":
-            device = LocalSimulator()
+            device = _LOCAL_SIMULATOR
             task = device.run(circuit, shots=shots)
             result = task.result()
             counts = result.measurement_counts
@@ -94,7 +96,7 @@ def run_ionq(circuit_data: dict, credentials: dict = None) -> dict:
             }
         elif backend_name == "sv1":
             # SV1 is a managed simulator in Braket
-            device = AwsDevice("arn:aws:braket:::device/quantum-simulator/amazon/sv1")
+            device = _get_aws_device("arn:aws:braket:::device/quantum-simulator/amazon/sv1")
             task = device.run(circuit, shots=shots)
             result = task.result()
             counts = result.measurement_counts
@@ -102,9 +104,12 @@ def run_ionq(circuit_data: dict, credentials: dict = None) -> dict:
             statevector = None
             probabilities = None
             if ResultType.StateVector() in circuit.result_types:
-                 statevector = result.values[ResultType.StateVector()].tolist()
-                 probabilities = {f"{bin(i)[2:].zfill(circuit_data['qubits'])}": abs(amp)**2 
-                                 for i, amp in enumerate(statevector)}
+                 # Kept as a complex ndarray (encoded by the app's JSON provider) instead of a list of
+                 # Python complex numbers; only non-negligible probabilities get a bitstring label
+                 statevector = np.asarray(result.get_value_by_result_type(ResultType.StateVector()))
+                 probs = statevector.real**2 + statevector.imag**2
+                 probabilities = {format(int(i), f"0{circuit_data['qubits']}b"): float(probs[i])
+                                  for i in np.flatnonzero(probs > 1e-12)}
 
             return {
                 "backend_used": "AWS Braket SV1 Simulator",
@@ -124,7 +129,7 @@ def run_ionq(circuit_data: dict, credentials: dict = None) -> dict:
                 # Ensure AWS credentials are set as environment variables or configured in ~/.aws/credentials
                 # before this line is executed. Braket SDK picks them up automatically.
                 # If not set, AwsDevice will raise an error.
-                device = AwsDevice("arn:aws:braket:::device/qpu/ionq/ionQdevice")
+                device = _get_aws_device("arn:aws:braket:::device/qpu/ionq/ionQdevice")
                 # You could add a small, quick query here to further validate connectivity
                 # For example, device.properties or device.status
             except Exception as e:
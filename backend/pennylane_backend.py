@@ -1,64 +1,195 @@
 # pennylane_backend.py
+import functools
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, NamedTuple
 import pennylane as qml
 from pennylane import numpy as np
 import os
 
-def _build_pennylane_circuit(circuit_data: dict, dev: qml.Device):
-    """Builds a PennyLane QNode function from the standardized circuit data."""
+try:
+    import catalyst # Optional: pip install pennylane-catalyst, enables use_qjit
+except ImportError:
+    catalyst = None
+
+# Devices Catalyst can compile QNodes for
+_QJIT_BACKENDS = {"lightning.qubit", "lightning.kokkos"}
+
+def _ccx_wires(gate_info: dict) -> list:
+    controls = gate_info.get("controls")
+    if controls and len(controls) == 2:
+        return [controls[0], controls[1], gate_info["target"]]
+    raise ValueError("CCX gate requires exactly 2 control qubits.")
+
+def _pl_theta(gate_info: dict):
+    return gate_info.get("params", {}).get("theta", 0)
+
+_target_wires = lambda g: [g["target"]]
+
+# Up to this many wires, counts are histogrammed with a 2^n-bin bincount rather than np.unique
+_BINCOUNT_MAX_WIRES = 16
+
+# Lowercased gate name -> (operation, wires getter, takes theta). 'measure' is handled in
+# _normalize_circuit: samples of every wire are returned at the end instead.
+_PL_GATE_TABLE = {
+    "h": (qml.Hadamard, _target_wires, False),
+    "x": (qml.PauliX, _target_wires, False),
+    "y": (qml.PauliY, _target_wires, False),
+    "z": (qml.PauliZ, _target_wires, False),
+    "s": (qml.S, _target_wires, False),
+    "sdg": (qml.adjoint(qml.S), _target_wires, False),
+    "t": (qml.T, _target_wires, False),
+    "tdg": (qml.adjoint(qml.T), _target_wires, False),
+    "rx": (qml.RX, _target_wires, True),
+    "ry": (qml.RY, _target_wires, True),
+    "rz": (qml.RZ, _target_wires, True),
+    "cx": (qml.CNOT, lambda g: [g.get("control"), g["target"]], False),
+    "ccx": (qml.Toffoli, _ccx_wires, False),
+    "swap": (qml.SWAP, lambda g: [g["target"], g.get("control")], False), # Assuming 'control' is the second qubit for swap
+}
+
+class NormalizedGate(NamedTuple):
+    """
+    One resolved gate. A NamedTuple keeps the compact, slot-free tuple layout (no per-gate dict)
+    and still unpacks directly in the QNode loop.
+    """
+    operation: Any
+    wires: tuple
+    params: tuple
+
+def _normalize_circuit(circuit_data: dict) -> tuple[list, bool]:
+    """
+    Resolves every gate once into a NormalizedGate, so the QNode body only replays plain
+    tuples instead of re-reading the gate dicts on every execution.
+
+    Returns:
+        tuple: (list of gate tuples, whether the circuit contains measurements)
+    """
+    ops = []
+    has_measurements = False
+    for gate_info in circuit_data["gates"]:
+        gate_type = gate_info["gate"].lower()
+        if gate_type == "measure":
+            has_measurements = True
+            continue
+        gate_spec = _PL_GATE_TABLE.get(gate_type)
+        if gate_spec is None:
+            raise ValueError(f"Unsupported gate type for PennyLane: {gate_type}")
+        operation, wires_of, takes_theta = gate_spec
+        ops.append(NormalizedGate(operation, tuple(wires_of(gate_info)), (_pl_theta(gate_info),) if takes_theta else ()))
+    return ops, has_measurements
+
+def _per_thread_lru_cache(maxsize: int):
+    """
+    Like functools.lru_cache (positional arguments only), but every thread gets its own cache.
+    Devices such as lightning.qubit hold simulator state, so one device (or a program compiled
+    for it) must never run circuits from two threads at once; /run_batch and threaded servers
+    call run_pennylane concurrently.
+    """
+    def decorator(func):
+        local = threading.local()
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            cache = getattr(local, "cache", None)
+            if cache is None:
+                cache = local.cache = OrderedDict()
+            if args in cache:
+                cache.move_to_end(args)
+                return cache[args]
+            value = func(*args) # Raises without caching on failure
+            cache[args] = value
+            if len(cache) > maxsize:
+                cache.popitem(last=False)
+            return value
+        return wrapper
+    return decorator
+
+@_per_thread_lru_cache(maxsize=16)
+def _get_pennylane_device(backend_name: str, num_wires: int, shots, api_key: str = None):
+    # Creating a device loads its plugin (and Lightning's C++ simulator), so devices are reused
+    # across runs with the same (backend, wires, shots, key) within a thread. Failed creations
+    # raise and are not cached.
+    if api_key is None:
+        return qml.device(backend_name, wires=num_wires, shots=shots)
+    dev = qml.device(backend_name, wires=num_wires, shots=shots, api_key=api_key)
+    # Attempt a simple device property check to validate
+    _ = dev.capabilities # This will often fail if connection/auth is bad
+    return dev
+
+class StatevectorProbabilities(Mapping):
+    """
+    Read-only {bitstring: probability} view of a statevector. Keys are formatted and probabilities
+    computed on demand from the NumPy array instead of building 2^n Python strings and floats up
+    front; only basis states with probability above 1e-12 are present. The app's JSON providers
+    encode it as a plain dict.
+    """
+    def __init__(self, statevector: np.ndarray):
+        self._statevector = statevector
+        self._num_qubits = int(statevector.shape[0]).bit_length() - 1
+
+    def _probability(self, index: int) -> float:
+        amplitude = self._statevector[index]
+        return float(amplitude.real**2 + amplitude.imag**2)
+
+    @functools.cached_property
+    def _support(self) -> np.ndarray:
+        probs = self._statevector.real**2 + self._statevector.imag**2
+        return np.flatnonzero(probs > 1e-12)
+
+    def __getitem__(self, bitstring: str) -> float:
+        if not isinstance(bitstring, str) or len(bitstring) != self._num_qubits:
+            raise KeyError(bitstring)
+        try:
+            probability = self._probability(int(bitstring, 2))
+        except ValueError:
+            raise KeyError(bitstring) from None
+        if probability <= 1e-12:
+            raise KeyError(bitstring)
+        return probability
+
+    def __iter__(self):
+        for index in self._support:
+            yield format(int(index), f'0{self._num_qubits}b')
+
+    def __len__(self) -> int:
+        return len(self._support)
+
+def _build_pennylane_circuit(circuit_data: dict, dev: qml.Device) -> tuple:
+    """
+    Builds a PennyLane QNode function from the standardized circuit data.
+
+    Returns:
+        tuple: (QNode, whether the circuit contains measurements)
+    """
     num_qubits = circuit_data["qubits"]
+    ops, has_measurements = _normalize_circuit(circuit_data)
 
     @qml.qnode(dev)
     def quantum_program():
-        for gate_info in circuit_data["gates"]:
-            gate_type = gate_info["gate"].lower()
-            target_qubit = gate_info["target"]
-            control_qubit = gate_info.get("control")
-            controls = gate_info.get("controls")
-            params = gate_info.get("params", {})
-
-            if gate_type == "h":
-                qml.Hadamard(wires=target_qubit)
-            elif gate_type == "x":
-                qml.PauliX(wires=target_qubit)
-            elif gate_type == "y":
-                qml.PauliY(wires=target_qubit)
-            elif gate_type == "z":
-                qml.PauliZ(wires=target_qubit)
-            elif gate_type == "s":
-                qml.S(wires=target_qubit)
-            elif gate_type == "sdg":
-                qml.Adjoint(qml.S(wires=target_qubit))
-            elif gate_type == "t":
-                qml.T(wires=target_qubit)
-            elif gate_type == "tdg":
-                qml.Adjoint(qml.T(wires=target_qubit))
-            elif gate_type == "rx":
-                qml.RX(params.get("theta", 0), wires=target_qubit)
-            elif gate_type == "ry":
-                qml.RY(params.get("theta", 0), wires=target_qubit)
-            elif gate_type == "rz":
-                qml.RZ(params.get("theta", 0), wires=target_qubit)
-            elif gate_type == "cx":
-                qml.CNOT(wires=[control_qubit, target_qubit])
-            elif gate_type == "ccx":
-                if controls and len(controls) == 2:
-                    qml.Toffoli(wires=[controls[0], controls[1], target_qubit])
-                else:
-                    raise ValueError("CCX gate requires exactly 2 control qubits.")
-            elif gate_type == "swap":
-                qml.SWAP(wires=[target_qubit, control_qubit]) # Assuming 'control' is the second qubit for swap
-            elif gate_type == "measure":
-                pass 
-            else:
-                raise ValueError(f"Unsupported gate type for PennyLane: {gate_type}")
-        
-        has_measurements = any(g["gate"].lower() == "measure" for g in circuit_data["gates"])
+        for operation, wires, params in ops:
+            operation(*params, wires=wires)
+
         if has_measurements:
-            return [qml.sample(wires=q) for q in range(num_qubits)]
+            # One joint sample of all wires: per-wire qml.sample() calls are sampled
+            # independently on some devices (lightning.qubit), losing correlations between wires
+            return qml.sample(wires=range(num_qubits))
         else:
             return qml.state()
     
-    return quantum_program
+    return quantum_program, has_measurements
+
+@_per_thread_lru_cache(maxsize=32)
+def _get_qjit_program(backend_name: str, num_qubits: int, shots, canonical_gates: str):
+    # Compiling with Catalyst costs far more than one execution, so compiled programs are kept
+    # per (backend, qubits, shots, canonical JSON of the gates). qjit compiles on the first call.
+    # Per-thread like the device it is bound to.
+    circuit_data = {"qubits": num_qubits, "gates": json.loads(canonical_gates)}
+    dev = _get_pennylane_device(backend_name, num_qubits, shots)
+    quantum_program, has_measurements = _build_pennylane_circuit(circuit_data, dev)
+    return catalyst.qjit(quantum_program), has_measurements
 
 def run_pennylane(circuit_data: dict, credentials: dict = None) -> dict:
     """
@@ -69,6 +200,8 @@ def run_pennylane(circuit_data: dict, credentials: dict = None) -> dict:
                              Expected format: {"qubits": int, "gates": list}
         credentials (dict): A dictionary containing 'backend_name' (e.g., "default.qubit", "lightning.qubit")
                             and optionally PENNYLANE_API_KEY if a remote device is used.
+                            With use_qjit=True, Lightning circuits are compiled with Catalyst (if installed)
+                            and reused for repeated identical circuits.
 
     Returns:
         dict: Simulation results including counts, statevector, and probabilities.
@@ -77,13 +210,16 @@ def run_pennylane(circuit_data: dict, credentials: dict = None) -> dict:
     shots = credentials.get("shots", 1024)
     pennylane_api_key = credentials.get("PENNYLANE_API_KEY")
 
+    if isinstance(shots, list):
+        shots = tuple(shots) # Shot vectors must be hashable for the device cache
+
     try:
         dev = None
         if backend_name == "default.qubit":
-            dev = qml.device("default.qubit", wires=circuit_data["qubits"], shots=shots)
+            dev = _get_pennylane_device("default.qubit", circuit_data["qubits"], shots)
         elif backend_name == "lightning.qubit":
             # Requires PennyLane-Lightning plugin: pip install pennylane-lightning
-            dev = qml.device("lightning.qubit", wires=circuit_data["qubits"], shots=shots)
+            dev = _get_pennylane_device("lightning.qubit", circuit_data["qubits"], shots)
         # Add logic for other PennyLane-supported backends, including QPUs
         # For example, if using a cloud-based QPU via PennyLane plugin:
         # elif backend_name.startswith("qcs."): # Example for Quantinuum QCS
@@ -94,9 +230,7 @@ def run_pennylane(circuit_data: dict, credentials: dict = None) -> dict:
             # For any other backend, assume it might be a remote QPU requiring a key
             if pennylane_api_key:
                 try:
-                    dev = qml.device(backend_name, wires=circuit_data["qubits"], shots=shots, api_key=pennylane_api_key)
-                    # Attempt a simple device property check to validate
-                    _ = dev.capabilities # This will often fail if connection/auth is bad
+                    dev = _get_pennylane_device(backend_name, circuit_data["qubits"], shots, pennylane_api_key)
                 except Exception as e:
                     raise ValueError(f"Failed to initialize PennyLane device '{backend_name}' with provided API key. Error: {e}")
             else:
@@ -105,25 +239,44 @@ def run_pennylane(circuit_data: dict, credentials: dict = None) -> dict:
         if dev is None:
             raise ValueError(f"Could not initialize PennyLane device for backend: {backend_name}")
 
-        quantum_program = _build_pennylane_circuit(circuit_data, dev)
-        
-        has_measurements = any(g["gate"].lower() == "measure" for g in circuit_data["gates"])
+        # Compilation only pays off for circuits that are run repeatedly, so it is opt-in;
+        # shot vectors are left to the regular QNode
+        use_qjit = (credentials.get("use_qjit", False) and catalyst is not None
+                    and backend_name in _QJIT_BACKENDS and not isinstance(shots, tuple))
+        if use_qjit:
+            canonical_gates = json.dumps(circuit_data["gates"], sort_keys=True)
+            quantum_program, has_measurements = _get_qjit_program(backend_name, circuit_data["qubits"], shots, canonical_gates)
+        else:
+            quantum_program, has_measurements = _build_pennylane_circuit(circuit_data, dev)
 
         if has_measurements:
             raw_samples = quantum_program()
+            if use_qjit:
+                raw_samples = np.asarray(raw_samples) # JAX array -> NumPy array
             
-            if isinstance(raw_samples, np.ndarray) and raw_samples.ndim == 2:
-                bitstrings = ["".join(str(int(b)) for b in shot) for shot in raw_samples]
-            elif isinstance(raw_samples, list) and all(isinstance(s, np.ndarray) for s in raw_samples):
-                 if raw_samples and raw_samples[0].ndim == 1:
-                    stacked_samples = np.array(raw_samples).T
-                    bitstrings = ["".join(str(int(b)) for b in shot) for shot in stacked_samples]
-                 else:
-                     raise TypeError("Unexpected sample format from PennyLane.")
+            # One 1-D array of 0/1 samples per wire, from the (shots, wires) sample matrix
+            # (a single wire comes back as a (shots,) vector)
+            if isinstance(raw_samples, np.ndarray) and raw_samples.ndim in (1, 2):
+                wire_samples = list(raw_samples.reshape(raw_samples.shape[0], -1).T)
             else:
                  raise TypeError("Unexpected sample format from PennyLane.")
 
-            counts = {b: bitstrings.count(b) for b in set(bitstrings)}
+            # Pack each shot (first wire leftmost) into an integer with one in-place shift/or pass
+            # per wire, without stacking the samples into a (shots, wires) matrix first, then
+            # histogram the integers, formatting only the distinct outcomes as bitstrings
+            num_wires = len(wire_samples)
+            outcomes = np.zeros(wire_samples[0].shape[0], dtype=np.uint64, requires_grad=False)
+            for wire_bits in wire_samples:
+                outcomes <<= np.uint64(1)
+                outcomes |= wire_bits.astype(np.uint64)
+            if num_wires <= _BINCOUNT_MAX_WIRES:
+                # Small registers: one linear bincount pass instead of sorting the shots
+                bins = np.bincount(outcomes.astype(np.int64), minlength=1 << num_wires)
+                values = np.flatnonzero(bins)
+                value_counts = bins[values]
+            else:
+                values, value_counts = np.unique(outcomes, return_counts=True)
+            counts = {format(int(value), f'0{num_wires}b'): int(count) for value, count in zip(values, value_counts)}
             
             return {
                 "backend_used": f"PennyLane {backend_name} Simulator",
@@ -133,18 +286,13 @@ def run_pennylane(circuit_data: dict, credentials: dict = None) -> dict:
                 "probabilities": None
             }
         else:
-            statevector = quantum_program()
-            statevector_list = statevector.tolist()
-            
-            probabilities = {
-                format(i, f'0{circuit_data["qubits"]}b'): abs(amp)**2
-                for i, amp in enumerate(statevector_list)
-            }
+            statevector = qml.math.unwrap(quantum_program()) # Complex ndarray, encoded by the app's JSON provider
+            probabilities = StatevectorProbabilities(statevector)
             return {
                 "backend_used": f"PennyLane {backend_name} Simulator (Statevector)",
                 "num_qubits": circuit_data["qubits"],
                 "counts": None,
-                "statevector": statevector_list,
+                "statevector": statevector,
                 "probabilities": probabilities
             }
 
@@ -1,56 +1,145 @@
 # quantinuum_backend.py
+import functools
+import json
 from azure.quantum.qiskit import AzureQuantumProvider
 from qiskit import QuantumCircuit, transpile
+from qiskit.circuit import CircuitInstruction, Measure, Parameter
+from qiskit.circuit.library import (
+    CCXGate, CXGate, HGate, RXGate, RYGate, RZGate, SdgGate, SGate, SwapGate, TdgGate, TGate, XGate, YGate, ZGate,
+)
 import qiskit_aer
 
 # pip install azure-quantum qiskit qiskit-aer
 
+# In-process simulator used instead of an Azure simulator target when prefer_local is set
+_LOCAL_SIMULATOR = qiskit_aer.AerSimulator(method="statevector")
+
+def _quantinuum_ccx(gate_info: dict) -> tuple:
+    controls = gate_info["controls"]
+    if len(controls) == 2:
+        return (controls[0], controls[1], gate_info["target"])
+    raise ValueError(f"CCX gate requires exactly 2 control qubits, got {len(controls)}")
+
+_target_qubit = lambda g: (g["target"],)
+
+# Lowercased gate name -> (gate class, qubit indices getter, takes theta). Gates are appended as
+# prebuilt instructions, skipping the argument handling of the QuantumCircuit.h/.rx/... wrappers.
+# Parameterless gate classes return shared singleton instances.
+_QUANTINUUM_GATE_DISPATCH = {
+    "h": (HGate, _target_qubit, False),
+    "x": (XGate, _target_qubit, False),
+    "y": (YGate, _target_qubit, False),
+    "z": (ZGate, _target_qubit, False),
+    "s": (SGate, _target_qubit, False),
+    "sdg": (SdgGate, _target_qubit, False),
+    "t": (TGate, _target_qubit, False),
+    "tdg": (TdgGate, _target_qubit, False),
+    "rx": (RXGate, _target_qubit, True),
+    "ry": (RYGate, _target_qubit, True),
+    "rz": (RZGate, _target_qubit, True),
+    "cx": (CXGate, lambda g: (g["control"], g["target"]), False),
+    "ccx": (CCXGate, _quantinuum_ccx, False),
+    "swap": (SwapGate, lambda g: (g["target"], g["control"]), False),
+    "measure": (Measure, _target_qubit, False), # Into the classical bit with the qubit's index
+}
+
 def _build_qiskit_circuit_quantinuum(circuit_data: dict) -> QuantumCircuit:
     """Builds a Qiskit QuantumCircuit from the standardized circuit data."""
     num_qubits = circuit_data["qubits"]
     circuit = QuantumCircuit(num_qubits, num_qubits) # Classical bits for measurement
+    circuit_qubits = circuit.qubits
+    circuit_clbits = circuit.clbits
 
     for gate_info in circuit_data["gates"]:
         gate_type = gate_info["gate"].lower()
-
-        if gate_type == "h":
-            circuit.h(gate_info["target"])
-        elif gate_type == "x":
-            circuit.x(gate_info["target"])
-        elif gate_type == "y":
-            circuit.y(gate_info["target"])
-        elif gate_type == "z":
-            circuit.z(gate_info["target"])
-        elif gate_type == "s":
-            circuit.s(gate_info["target"])
-        elif gate_type == "sdg":
-            circuit.sdg(gate_info["target"])
-        elif gate_type == "t":
-            circuit.t(gate_info["target"])
-        elif gate_type == "tdg":
-            circuit.tdg(gate_info["target"])
-        elif gate_type == "rx":
-            circuit.rx(gate_info["params"]["theta"], gate_info["target"])
-        elif gate_type == "ry":
-            circuit.ry(gate_info["params"]["theta"], gate_info["target"])
-        elif gate_type == "rz":
-            circuit.rz(gate_info["params"]["theta"], gate_info["target"])
-        elif gate_type == "cx":
-            circuit.cx(gate_info["control"], gate_info["target"])
-        elif gate_type == "ccx":
-            controls = gate_info["controls"]
-            if len(controls) == 2:
-                circuit.ccx(controls[0], controls[1], gate_info["target"])
-            else:
-                raise ValueError(f"CCX gate requires exactly 2 control qubits, got {len(controls)}")
-        elif gate_type == "swap":
-            circuit.swap(gate_info["target"], gate_info["control"])
-        elif gate_type == "measure":
-            circuit.measure(gate_info["target"], gate_info["target"])
-        else:
+        gate_spec = _QUANTINUUM_GATE_DISPATCH.get(gate_type)
+        if gate_spec is None:
             raise ValueError(f"Unsupported gate type for Quantinuum (Azure Quantum): {gate_type}")
+        gate_class, qubits_of, takes_theta = gate_spec
+        indices = qubits_of(gate_info)
+        # _append does no checking of its own, so validate the indices here
+        if any(not isinstance(q, int) or not 0 <= q < num_qubits for q in indices) or len(set(indices)) != len(indices):
+            raise ValueError(f"Invalid qubit indices for gate '{gate_type}': {list(indices)}")
+        circuit._append(CircuitInstruction(
+            gate_class(gate_info["params"]["theta"]) if takes_theta else gate_class(),
+            tuple(circuit_qubits[q] for q in indices),
+            (circuit_clbits[indices[0]],) if gate_class is Measure else (),
+        ))
     return circuit
 
+_ROTATION_GATES = {"rx", "ry", "rz"}
+
+@functools.lru_cache(maxsize=64)
+def _transpiled_template(backend, num_qubits: int, canonical_structure: str) -> tuple:
+    # Transpiles a circuit structure once per backend, with a Parameter in place of every rotation
+    # angle, so circuits that differ only in their angles (parameter sweeps) share the result
+    gates = json.loads(canonical_structure)
+    parameters = []
+    for gate_info in gates:
+        if gate_info["gate"].lower() in _ROTATION_GATES:
+            parameters.append(Parameter(f"theta_{len(parameters)}"))
+            gate_info["params"] = {"theta": parameters[-1]}
+    circuit = _build_qiskit_circuit_quantinuum({"qubits": num_qubits, "gates": gates})
+    return transpile(circuit, backend, optimization_level=2), tuple(parameters)
+
+def _transpile_for_backend(circuit_data: dict, backend) -> QuantumCircuit:
+    """
+    Returns circuit_data transpiled for backend, reusing the cached transpilation of its structure
+    (gate types and qubits, keyed on canonical JSON) and binding this circuit's angles into a copy.
+    """
+    thetas = []
+    structure = []
+    for gate_info in circuit_data["gates"]:
+        gate_type = gate_info["gate"].lower()
+        if gate_type in _ROTATION_GATES:
+            thetas.append(gate_info["params"]["theta"])
+        # Lowercased once here, so "H" and "h" circuits also share a template
+        structure.append({**{key: value for key, value in gate_info.items() if key != "params"}, "gate": gate_type})
+    template, parameters = _transpiled_template(backend, circuit_data["qubits"], json.dumps(structure, sort_keys=True))
+    # strict=False: transpilation may drop a rotation (e.g. a diagonal gate right before a measurement)
+    return template.assign_parameters(dict(zip(parameters, thetas)), strict=False)
+
+# The provider authenticates against the workspace, so one provider is kept per workspace and
+# shared by all of its backends; get_backend lists the workspace targets, so each backend is also
+# looked up once and reused. Failed lookups raise and are not cached.
+@functools.lru_cache(maxsize=None)
+def _get_azure_provider(resource_id: str, location: str) -> AzureQuantumProvider:
+    return AzureQuantumProvider(resource_id=resource_id, location=location)
+
+@functools.lru_cache(maxsize=None)
+def _get_azure_backend(resource_id: str, location: str, backend_name: str):
+    return _get_azure_provider(resource_id, location).get_backend(backend_name)
+
+def _get_quantinuum_backend(backend_name: str, credentials: dict) -> tuple:
+    """
+    Resolves the Azure Quantum backend for a Quantinuum backend name.
+
+    Returns:
+        tuple: (backend, backend_used label for the response)
+    """
+    if backend_name.startswith("quantinuum.sim"): # Quantinuum simulators via Azure
+        target_kind, label = "simulators on Azure", f"Quantinuum Simulator (Azure Quantum): {backend_name}"
+    elif backend_name.startswith("quantinuum.qpu"): # Quantinuum QPU via Azure
+        target_kind, label = "QPU", f"Quantinuum QPU (Azure Quantum): {backend_name}"
+    else:
+        raise ValueError(f"Unsupported Quantinuum backend: {backend_name}")
+
+    sub_id = credentials.get("AZURE_QUANTUM_SUBSCRIPTION_ID")
+    resource_group = credentials.get("AZURE_QUANTUM_RESOURCE_GROUP")
+    workspace_name = credentials.get("AZURE_QUANTUM_WORKSPACE_NAME")
+    location = credentials.get("AZURE_QUANTUM_LOCATION")
+    if not (sub_id and resource_group and workspace_name and location):
+        raise ValueError(f"Azure Quantum workspace credentials are required for Quantinuum {target_kind}.")
+    try:
+        backend = _get_azure_backend(
+            f"/subscriptions/{sub_id}/resourceGroups/{resource_group}/providers/Microsoft.Quantum/Workspaces/{workspace_name}",
+            location,
+            backend_name,
+        )
+    except Exception as e:
+        raise ValueError(f"Failed to connect to Azure Quantum workspace or backend '{backend_name}': {e}. Check Azure credentials and backend name.")
+    return backend, label
+
 def run_quantinuum(circuit_data: dict, credentials: dict = None) -> dict:
     """
     Executes a quantum circuit on a Quantinuum QPU via Azure Quantum.
@@ -61,16 +150,13 @@ def run_quantinuum(circuit_data: dict, credentials: dict = None) -> dict:
         credentials (dict): A dictionary containing Azure Quantum workspace details:
                             AZURE_QUANTUM_SUBSCRIPTION_ID, AZURE_QUANTUM_RESOURCE_GROUP,
                             AZURE_QUANTUM_WORKSPACE_NAME, AZURE_QUANTUM_LOCATION,
-                            and 'backend_name'.
+                            and 'backend_name'. With prefer_local=True, 'quantinuum.sim*' backends
+                            are replaced by a local Aer simulator and no Azure job is submitted.
 
     Returns:
         dict: Simulation results including counts, statevector (if applicable),
               probabilities (if applicable), and backend used.
     """
-    sub_id = credentials.get("AZURE_QUANTUM_SUBSCRIPTION_ID")
-    resource_group = credentials.get("AZURE_QUANTUM_RESOURCE_GROUP")
-    workspace_name = credentials.get("AZURE_QUANTUM_WORKSPACE_NAME")
-    location = credentials.get("AZURE_QUANTUM_LOCATION")
     backend_name = credentials.get("backend_name") # e.g., "quantinuum.sim.h1-1sc", "quantinuum.qpu.h1"
     shots = credentials.get("shots", 1024)
 
@@ -78,55 +164,77 @@ def run_quantinuum(circuit_data: dict, credentials: dict = None) -> dict:
         raise ValueError("Quantinuum backend name (e.g., 'quantinuum.sim.h1-1sc' or 'quantinuum.qpu.h1') not specified.")
 
     try:
-        circuit = _build_qiskit_circuit_quantinuum(circuit_data)
-
-        if backend_name.startswith("quantinuum.sim"): # Quantinuum simulators via Azure
-            if not (sub_id and resource_group and workspace_name and location):
-                raise ValueError("Azure Quantum workspace credentials are required for Quantinuum simulators on Azure.")
-            try:
-                provider = AzureQuantumProvider(
-                    resource_id=f"/subscriptions/{sub_id}/resourceGroups/{resource_group}/providers/Microsoft.Quantum/Workspaces/{workspace_name}",
-                    location=location
-                )
-                backend = provider.get_backend(backend_name)
-            except Exception as e:
-                raise ValueError(f"Failed to connect to Azure Quantum workspace or backend '{backend_name}': {e}. Check Azure credentials and backend name.")
-            
-            job = backend.run(circuit, shots=shots)
-            result = job.result()
-            counts = result.get_counts(circuit)
+        if backend_name.startswith("quantinuum.sim") and credentials.get("prefer_local", False):
+            # Small circuits finish locally long before an Azure simulator job is even scheduled
+            local_circuit = _transpile_for_backend(circuit_data, _LOCAL_SIMULATOR)
+            result = _LOCAL_SIMULATOR.run(local_circuit, shots=shots).result()
             return {
-                "backend_used": f"Quantinuum Simulator (Azure Quantum): {backend_name}",
+                "backend_used": f"Local Aer Simulator (in place of {backend_name})",
                 "num_qubits": circuit_data["qubits"],
-                "counts": counts,
+                "counts": result.get_counts(),
                 "statevector": None,
                 "probabilities": None
             }
 
-        elif backend_name.startswith("quantinuum.qpu"): # Quantinuum QPU via Azure
-            if not (sub_id and resource_group and workspace_name and location):
-                raise ValueError("Azure Quantum workspace credentials are required for Quantinuum QPU.")
-            try:
-                provider = AzureQuantumProvider(
-                    resource_id=f"/subscriptions/{sub_id}/resourceGroups/{resource_group}/providers/Microsoft.Quantum/Workspaces/{workspace_name}",
-                    location=location
-                )
-                backend = provider.get_backend(backend_name)
-            except Exception as e:
-                raise ValueError(f"Failed to connect to Azure Quantum workspace or backend '{backend_name}': {e}. Check Azure credentials and backend name.")
-            
-            job = backend.run(circuit, shots=shots)
-            result = job.result()
-            counts = result.get_counts(circuit)
-            return {
-                "backend_used": f"Quantinuum QPU (Azure Quantum): {backend_name}",
+        backend, backend_used = _get_quantinuum_backend(backend_name, credentials)
+        circuit = _transpile_for_backend(circuit_data, backend)
+
+        job = backend.run(circuit, shots=shots)
+        result = job.result()
+        counts = result.get_counts(circuit)
+        return {
+            "backend_used": backend_used,
+            "num_qubits": circuit_data["qubits"],
+            "counts": counts,
+            "statevector": None,
+            "probabilities": None
+        }
+
+    except Exception as e:
+        return {"error": str(e), "backend_used": backend_name or "N/A"}
+
+def run_quantinuum_batch(batch: list[dict], credentials: dict) -> list[dict]:
+    """
+    Runs several circuits on the same Quantinuum backend via Azure Quantum. Every job is submitted
+    before any result is awaited, so the jobs wait in the Azure queue together instead of one
+    round-trip after another. Accepts the same credentials keys as run_quantinuum (prefer_local
+    runs each circuit locally) and returns one result dict per circuit.
+    """
+    backend_name = credentials.get("backend_name")
+    shots = credentials.get("shots", 1024)
+
+    try:
+        if not backend_name:
+            raise ValueError("Quantinuum backend name (e.g., 'quantinuum.sim.h1-1sc' or 'quantinuum.qpu.h1') not specified.")
+        if backend_name.startswith("quantinuum.sim") and credentials.get("prefer_local", False):
+            return [run_quantinuum(circuit_data, credentials) for circuit_data in batch]
+        backend, backend_used = _get_quantinuum_backend(backend_name, credentials)
+    except Exception as e:
+        error = {"error": str(e), "backend_used": backend_name or "N/A"}
+        return [dict(error) for _ in batch]
+
+    # Submit everything first; a circuit that fails to build or submit keeps its exception
+    jobs = []
+    for circuit_data in batch:
+        try:
+            circuit = _transpile_for_backend(circuit_data, backend)
+            jobs.append((circuit, backend.run(circuit, shots=shots)))
+        except Exception as e:
+            jobs.append(e)
+
+    results = []
+    for circuit_data, job in zip(batch, jobs):
+        try:
+            if isinstance(job, Exception):
+                raise job
+            circuit, job = job
+            results.append({
+                "backend_used": backend_used,
                 "num_qubits": circuit_data["qubits"],
-                "counts": counts,
+                "counts": job.result().get_counts(circuit),
                 "statevector": None,
                 "probabilities": None
-            }
-        else:
-            raise ValueError(f"Unsupported Quantinuum backend: {backend_name}")
-
-    except Exception as e:
-        return {"error": str(e), "backend_used": backend_name or "N/A"}
\ No newline at end of file
+            })
+        except Exception as e:
+            results.append({"error": str(e), "backend_used": backend_name})
+    return results
@@ -1,62 +1,140 @@
 # rigetti_backend.py
 from braket.devices import LocalSimulator
 from braket.aws import AwsDevice
-from braket.circuits import Circuit, Gate, Instruction, ResultType
+from braket.circuits import Circuit, FreeParameter, Gate, Instruction, ResultType
 import numpy as np
+import functools
+import json
 import os
 
-def _build_braket_circuit_rigetti(circuit_data: dict) -> Circuit:
+# Local Braket simulator, built once at import and shared by every local run
+_LOCAL_SIMULATOR = LocalSimulator()
+
+# AwsDevice() makes a GetDevice call to Braket, so each device is looked up once per ARN
+# and reused. A failed lookup raises and is not cached.
+@functools.lru_cache(maxsize=None)
+def _get_aws_device(arn: str) -> AwsDevice:
+    return AwsDevice(arn)
+
+def _braket_ccx(circuit: Circuit, gate_info: dict):
+    controls = gate_info.get("controls")
+    if controls and len(controls) == 2:
+        circuit.ccnot(controls[0], controls[1], gate_info["target"])
+    else:
+        raise ValueError("CCX gate requires exactly 2 control qubits.")
+
+# Lowercased gate name -> builder(circuit, gate_info) that appends the gate to the Braket circuit.
+# One dict lookup per gate instead of walking an if/elif chain.
+_BRAKET_GATE_BUILDERS = {
+    "h": lambda c, g: c.h(g["target"]),
+    "x": lambda c, g: c.x(g["target"]),
+    "y": lambda c, g: c.y(g["target"]),
+    "z": lambda c, g: c.z(g["target"]),
+    "s": lambda c, g: c.s(g["target"]),
+    "sdg": lambda c, g: c.sdg(g["target"]),
+    "t": lambda c, g: c.t(g["target"]),
+    "tdg": lambda c, g: c.tdg(g["target"]),
+    "rx": lambda c, g: c.rx(g["target"], g.get("params", {}).get("theta", 0)),
+    "ry": lambda c, g: c.ry(g["target"], g.get("params", {}).get("theta", 0)),
+    "rz": lambda c, g: c.rz(g["target"], g.get("params", {}).get("theta", 0)),
+    "cx": lambda c, g: c.cnot(g.get("control"), g["target"]),
+    "ccx": _braket_ccx,
+    "swap": lambda c, g: c.swap(g["target"], g.get("control")), # Frontend uses target/control, Braket swap is q1, q2
+    # Braket measurements are typically implicit or handled at the end of execution for counts
+    "measure": lambda c, g: None,
+}
+
+_ROTATION_GATES = {"rx", "ry", "rz"}
+
+@functools.lru_cache(maxsize=64)
+def _braket_template(canonical_structure: str) -> Circuit:
+    # Builds a circuit structure once, with a FreeParameter theta_<i> in place of the i-th rotation
+    # angle, so circuits that differ only in their angles (parameter sweeps) share one Circuit.
+    # Devices only serialize the circuit, so the cached template is never modified.
+    circuit = Circuit()
+    num_rotations = 0
+    for gate_info in json.loads(canonical_structure):
+        gate_type = gate_info["gate"].lower()
+        builder = _BRAKET_GATE_BUILDERS.get(gate_type)
+        if builder is None:
+            raise ValueError(f"Unsupported gate type for Rigetti (Braket): {gate_type}")
+        if gate_type in _ROTATION_GATES:
+            gate_info["params"] = {"theta": FreeParameter(f"theta_{num_rotations}")}
+            num_rotations += 1
+        builder(circuit, gate_info)
+    return circuit
+
+def _build_braket_circuit_rigetti(circuit_data: dict) -> tuple[Circuit, dict]:
     """
     Builds an Amazon Braket Circuit from the standardized circuit data,
     specifically tailored for Rigetti compatibility through Braket.
     Rigetti backends often prefer native gates. Braket handles some translation.
-    """
-    num_qubits = circuit_data["qubits"]
-    circuit = Circuit()
 
+    Returns:
+        tuple: (cached parametric circuit, inputs dict of rotation angles to pass to device.run)
+    """
+    inputs = {}
+    structure = []
     for gate_info in circuit_data["gates"]:
         gate_type = gate_info["gate"].lower()
-        target = gate_info["target"]
-        control = gate_info.get("control")
-        controls = gate_info.get("controls")
-        params = gate_info.get("params", {})
-        
-        if gate_type == "h":
-            circuit.h(target)
-        elif gate_type == "x":
-            circuit.x(target)
-        elif gate_type == "y":
-            circuit.y(target)
-        elif gate_type == "z":
-            circuit.z(target)
-        elif gate_type == "s":
-            circuit.s(target)
-        elif gate_type == "sdg":
-            circuit.sdg(target)
-        elif gate_type == "t":
-            circuit.t(target)
-        elif gate_type == "tdg":
-            circuit.tdg(target)
-        elif gate_type == "rx":
-            circuit.rx(target, params.get("theta", 0))
-        elif gate_type == "ry":
-            circuit.ry(target, params.get("theta", 0))
-        elif gate_type == "rz":
-            circuit.rz(target, params.get("theta", 0))
-        elif gate_type == "cx":
-            circuit.cnot(control, target)
-        elif gate_type == "ccx":
-            if controls and len(controls) == 2:
-                circuit.ccnot(controls[0], controls[1], target)
-            else:
-                raise ValueError("CCX gate requires exactly 2 control qubits.")
-        elif gate_type == "swap":
-            circuit.swap(target, control)
-        elif gate_type == "measure":
-            pass # Measurement for counts is handled by results, not by adding a gate
-        else:
-            raise ValueError(f"Unsupported gate type for Rigetti (Braket): {gate_type}")
-    return circuit
+        if gate_type in _ROTATION_GATES:
+            inputs[f"theta_{len(inputs)}"] = gate_info.get("params", {}).get("theta", 0)
+        # Lowercased once here, so "H" and "h" circuits also share a template
+        structure.append({**{key: value for key, value in gate_info.items() if key != "params"}, "gate": gate_type})
+    return _braket_template(json.dumps(structure, sort_keys=True)), inputs
+
+def _measurement_counts(result) -> dict:
+    """
+    Histograms the raw (shots, measured qubits) bit array of a Braket result in NumPy: each shot is
+    packed into an integer (first measured qubit leftmost) with one shift/or pass per qubit, and
+    only outcomes that occurred are formatted as bitstrings. Falls back to Braket's
+    measurement_counts when the device returned counts only or more than 64 qubits were measured.
+    """
+    measurements = result.measurements
+    if measurements is None or measurements.ndim != 2 or not 0 < measurements.shape[1] <= 64:
+        return result.measurement_counts
+    num_bits = measurements.shape[1]
+    outcomes = np.zeros(measurements.shape[0], dtype=np.uint64)
+    for column in range(num_bits):
+        outcomes <<= np.uint64(1)
+        outcomes |= measurements[:, column].astype(np.uint64)
+    if num_bits <= 16:
+        # Small registers: one linear bincount pass instead of sorting the shots
+        bins = np.bincount(outcomes.astype(np.int64), minlength=1 << num_bits)
+        values = np.flatnonzero(bins)
+        value_counts = bins[values]
+    else:
+        values, value_counts = np.unique(outcomes, return_counts=True)
+    return {format(int(value), f'0{num_bits}b'): int(count) for value, count in zip(values, value_counts)}
+
+def _get_rigetti_device(backend_name: str, credentials: dict) -> tuple:
+    """
+    Resolves the Braket device for a Rigetti backend name.
+
+    Returns:
+        tuple: (device, backend_used label for the response)
+    """
+    if backend_name == "local":
+        return _LOCAL_SIMULATOR, "AWS Braket Local Simulator (Rigetti context)"
+    elif backend_name == "rigetti/qpu": # Use a generic name for the frontend
+        aws_region = credentials.get("AWS_REGION")
+        if not (credentials.get("AWS_ACCESS_KEY_ID") and credentials.get("AWS_SECRET_ACCESS_KEY") and aws_region):
+            raise ValueError("AWS credentials (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION) are required for Rigetti QPU.")
+
+        # --- Actual Validation Step (Implicit via AwsDevice initialization) ---
+        try:
+            # Rigetti QPU ARNs are specific to region and device name
+            # Example: "arn:aws:braket:us-west-1::device/qpu/rigetti/Aspen-M-3"
+            # You might need a more dynamic way to get the exact ARN or map it from a simpler name
+            rigetti_qpu_arn = f"arn:aws:braket:{aws_region}::device/qpu/rigetti/Aspen-M-3" # Placeholder
+            device = _get_aws_device(rigetti_qpu_arn)
+            # Further validation: device.properties or device.status
+        except Exception as e:
+            raise ValueError(f"AWS Braket connection or Rigetti QPU access failed. Please check your AWS credentials, region, and QPU ARN. Error: {e}")
+        # --- End Validation Step ---
+        return device, f"Rigetti QPU (via AWS Braket): {rigetti_qpu_arn}"
+    else:
+        raise ValueError(f"Unsupported Rigetti backend: {backend_name}")
 
 def run_rigetti(circuit_data: dict, credentials: dict = None) -> dict:
     """
@@ -72,9 +150,6 @@ def run_rigetti(circuit_data: dict, credentials: dict = None) -> dict:
         dict: Simulation results including counts, statevector (if applicable),
               probabilities (if applicable), and backend used.
     """
-    aws_access_key_id = credentials.get("AWS_ACCESS_KEY_ID")
-    aws_secret_access_key = credentials.get("AWS_SECRET_ACCESS_KEY")
-    aws_region = credentials.get("AWS_REGION")
     backend_name = credentials.get("backend_name") # e.g., "rigetti/qpu", "local"
     shots = credentials.get("shots", 1024)
 
@@ -82,51 +157,23 @@ def run_rigetti(circuit_data: dict, credentials: dict = None) -> dict:
         raise ValueError("Rigetti backend name (e.g., 'rigetti/qpu' or 'local') not specified.")
 
     try:
-        circuit = _build_braket_circuit_rigetti(circuit_data)
+        circuit, inputs = _build_braket_circuit_rigetti(circuit_data)
+        device, backend_used = _get_rigetti_device(backend_name, credentials)
 
-        if backend_name == "local":
-            device = LocalSimulator()
-            task = device.run(circuit, shots=shots)
+        try:
+            task = device.run(circuit, shots=shots, inputs=inputs)
             result = task.result()
-            counts = result.measurement_counts
-            return {
-                "backend_used": "AWS Braket Local Simulator (Rigetti context)",
-                "num_qubits": circuit_data["qubits"],
-                "counts": counts,
-                "statevector": None,
-                "probabilities": None
-            }
-        elif backend_name == "rigetti/qpu": # Use a generic name for the frontend
-            if not (aws_access_key_id and aws_secret_access_key and aws_region):
-                raise ValueError("AWS credentials (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION) are required for Rigetti QPU.")
-            
-            # --- Actual Validation Step (Implicit via AwsDevice initialization) ---
-            try:
-                # Rigetti QPU ARNs are specific to region and device name
-                # Example: "arn:aws:braket:us-west-1::device/qpu/rigetti/Aspen-M-3"
-                # You might need a more dynamic way to get the exact ARN or map it from a simpler name
-                rigetti_qpu_arn = f"arn:aws:braket:{aws_region}::device/qpu/rigetti/Aspen-M-3" # Placeholder
-                device = AwsDevice(rigetti_qpu_arn)
-                # Further validation: device.properties or device.status
-            except Exception as e:
-                raise ValueError(f"AWS Braket connection or Rigetti QPU access failed. Please check your AWS credentials, region, and QPU ARN. Error: {e}")
-            # --- End Validation Step ---
-
-            try:
-                task = device.run(circuit, shots=shots)
-                result = task.result()
-                counts = result.measurement_counts
-                return {
-                    "backend_used": f"Rigetti QPU (via AWS Braket): {rigetti_qpu_arn}",
-                    "num_qubits": circuit_data["qubits"],
-                    "counts": counts,
-                    "statevector": None,
-                    "probabilities": None
-                }
-            except Exception as e:
-                raise RuntimeError(f"Failed to execute circuit on Rigetti QPU: {e}")
-        else:
-            raise ValueError(f"Unsupported Rigetti backend: {backend_name}")
+        except Exception as e:
+            if backend_name == "local":
+                raise
+            raise RuntimeError(f"Failed to execute circuit on Rigetti QPU: {e}")
+        return {
+            "backend_used": backend_used,
+            "num_qubits": circuit_data["qubits"],
+            "counts": _measurement_counts(result),
+            "statevector": None,
+            "probabilities": None
+        }
 
     except ValueError as e:
         # Specific validation errors (e.g., missing credentials, connection issues)
@@ -134,3 +181,44 @@ def run_rigetti(circuit_data: dict, credentials: dict = None) -> dict:
     except Exception as e:
         return {"error": str(e), "backend_used": backend_name or "N/A"}
 
+def run_rigetti_batch(batch: list[dict], credentials: dict) -> list[dict]:
+    """
+    Runs several circuits on the same Rigetti backend. Every task is submitted before any result
+    is awaited, so QPU tasks wait in the queue together instead of one network round-trip after
+    another. Accepts the same credentials keys as run_rigetti and returns one result dict per circuit.
+    """
+    backend_name = credentials.get("backend_name")
+    shots = credentials.get("shots", 1024)
+
+    try:
+        if not backend_name:
+            raise ValueError("Rigetti backend name (e.g., 'rigetti/qpu' or 'local') not specified.")
+        device, backend_used = _get_rigetti_device(backend_name, credentials)
+    except Exception as e:
+        error = {"error": str(e), "backend_used": backend_name or "N/A"}
+        return [dict(error) for _ in batch]
+
+    # Submit everything first; a circuit that fails to build or submit keeps its exception
+    tasks = []
+    for circuit_data in batch:
+        try:
+            circuit, inputs = _build_braket_circuit_rigetti(circuit_data)
+            tasks.append(device.run(circuit, shots=shots, inputs=inputs))
+        except Exception as e:
+            tasks.append(e)
+
+    results = []
+    for circuit_data, task in zip(batch, tasks):
+        try:
+            if isinstance(task, Exception):
+                raise task
+            results.append({
+                "backend_used": backend_used,
+                "num_qubits": circuit_data["qubits"],
+                "counts": _measurement_counts(task.result()),
+                "statevector": None,
+                "probabilities": None
+            })
+        except Exception as e:
+            results.append({"error": str(e), "backend_used": backend_name})
+    return results
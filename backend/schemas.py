@@ -0,0 +1,108 @@
+# schemas.py
+# Typed request payloads for the Flask API. msgspec decodes and validates the raw request body
+# in one pass, so handlers no longer walk the JSON dicts to fill in missing fields.
+from typing import Annotated, Any, Literal, Optional
+
+import msgspec
+
+
+class Gate(msgspec.Struct):
+    """A single gate as sent by the frontend circuit builder."""
+    gate: str
+    target: Optional[int] = None
+    control: Optional[int] = None
+    control1: Optional[int] = None
+    control2: Optional[int] = None
+    controls: Optional[list[int]] = None
+    classical_bit: Optional[int] = None
+    params: dict[str, Any] = {} # e.g. {"theta": 0.5} or {"theta": {"param": "theta_0"}}
+    qubits: list[int] = []
+
+
+class Circuit(msgspec.Struct):
+    qubits: int
+    gates: list[Gate] = []
+
+
+# A positive count of most likely basis states to return
+TopK = Annotated[int, msgspec.Meta(ge=1)]
+
+
+class RunRequest(msgspec.Struct):
+    """Payload of POST /run."""
+    provider: Optional[str] = None
+    circuit: Optional[Circuit] = None
+    use_simulator_if_qpu_fails: bool = False
+    simulator_choice: str = "aer_qasm_simulator" # Default fallback to Aer QASM
+    shots: int = 1024
+    precision: str = "double" # Aer simulation precision: "double" or "single"
+    top_k: Optional[TopK] = None # Optionally limit statevector probabilities to the k most likely states
+
+
+class RunBatchRequest(msgspec.Struct):
+    """Payload of POST /run_batch: several circuits for one provider."""
+    provider: Optional[str] = None
+    circuits: list[Circuit] = []
+    simulator_choice: str = "aer_qasm_simulator"
+    shots: int = 1024
+    precision: str = "double"
+    top_k: Optional[TopK] = None
+
+
+class EditorGate(msgspec.Struct):
+    """A gate in the editor format used by /transpile_circuit and the Gemini endpoints."""
+    name: str
+    qubits: list[int] = []
+    parameters: list[float] = []
+
+
+class EditorCircuit(msgspec.Struct):
+    gates: list[EditorGate] = []
+
+
+class TranspileRequest(msgspec.Struct):
+    """Payload of POST /transpile_circuit."""
+    circuit: Optional[EditorCircuit] = None
+    circuits: Optional[list[EditorCircuit]] = None # Batch of circuits, transpiled in parallel
+    target_backend_name: Optional[str] = None
+    num_qubits: Optional[int] = None
+    optimization_level: Optional[int] = None # 0-3; None uses the target backend's default
+    include_qasm: bool = True # False returns only gate count/depth metrics, skipping QASM export
+    full_optimization: bool = False # Without an explicit optimization_level, transpile at level 3
+    run_async: bool = msgspec.field(default=False, name="async") # Return 202 + job id instead of waiting
+
+
+class SaveCredentialsRequest(msgspec.Struct):
+    """Payload of POST /save_credentials."""
+    provider: Optional[str] = None
+    credentials: Optional[dict[str, Any]] = None
+
+
+# Structured output expected from Gemini. Optional fields the model leaves out stay absent
+# when re-encoded (omit_defaults), matching what the frontend received before validation.
+class GateSuggestion(msgspec.Struct, omit_defaults=True):
+    """One item of the /suggest_gates response."""
+    gate: str
+    title: str
+    reason: str
+    priority: Literal["high", "medium", "low"]
+    qubits: list[int]
+    parameters: Optional[list[float]] = None
+
+
+class CircuitFinding(msgspec.Struct, omit_defaults=True):
+    """One item of the /fix_circuit response."""
+    type: Literal["error", "warning", "info"]
+    title: str
+    description: str
+    action: str
+    fixable: bool
+    severity: Optional[Literal["high", "medium", "low"]] = None
+    gates_to_remove: Optional[list[str]] = None
+
+
+def circuit_to_dict(circuit: Circuit) -> dict:
+    """
+    Converts a decoded Circuit back into the plain dict form the backend runners expect.
+    """
+    return msgspec.to_builtins(circuit)
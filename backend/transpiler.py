@@ -0,0 +1,265 @@
+# transpiler.py
+# Circuit conversion and Qiskit transpilation for the /transpile_circuit endpoint.
+# Transpilation can take seconds on larger circuits, so it runs in a pool of worker processes
+# instead of the Flask request thread. Everything here is module-level so it can be pickled.
+import concurrent.futures
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+from collections import OrderedDict
+
+import numpy as np
+from qiskit import QuantumCircuit, qasm2, transpile
+from qiskit.circuit import CircuitInstruction, Gate
+from qiskit.circuit.library import (
+    CCXGate, CXGate, CYGate, CZGate, HGate, RXGate, RYGate, RZGate, SdgGate, SGate, SwapGate, TdgGate, TGate, UGate,
+    XGate, YGate, ZGate,
+)
+from qiskit.quantum_info import OneQubitEulerDecomposer
+from qiskit_aer import AerSimulator # For using AerSimulator as a target backend for transpilation
+# If you want to use fake backends for specific topologies:
+# from qiskit.providers.fake_provider import FakeLima, FakeManhattan # Example fake backends
+
+# Frontend gate name -> (gate class, number of qubits, number of parameters),
+# used to build circuits with one dict lookup per gate. Parameterless gate classes return
+# shared singleton instances, so only rotations allocate a new gate object.
+# 'measure' is handled separately since it also needs a classical bit.
+_TRANSPILE_GATE_DISPATCH = {
+    'h': (HGate, 1, 0),
+    'x': (XGate, 1, 0),
+    'y': (YGate, 1, 0),
+    'z': (ZGate, 1, 0),
+    's': (SGate, 1, 0),
+    'sdg': (SdgGate, 1, 0),
+    't': (TGate, 1, 0),
+    'tdg': (TdgGate, 1, 0),
+    'rx': (RXGate, 1, 1),
+    'ry': (RYGate, 1, 1),
+    'rz': (RZGate, 1, 1),
+    'u3': (UGate, 1, 3),
+    'cx': (CXGate, 2, 0),
+    'cy': (CYGate, 2, 0),
+    'cz': (CZGate, 2, 0),
+    'swap': (SwapGate, 2, 0),
+    'ccx': (CCXGate, 3, 0), # Toffoli
+    # Add more gate mappings as needed for your supported gates
+}
+
+# Target backends supported for transpilation: name -> (backend factory, default optimization level).
+# A default of None skips transpile() when the target has no coupling map: Aer simulators accept
+# every standard gate and have no layout to route for, so transpiling changes nothing at run time.
+# Fake hardware backends should default to 1, which is enough for the gate count/depth preview;
+# requests with full_optimization get level 3.
+_TRANSPILE_TARGETS = {
+    "aer_qasm_simulator": (lambda: AerSimulator(), None),
+    "aer_statevector_simulator": (lambda: AerSimulator(method='statevector'), None), # Or specific Aer method
+    # Add more backend mappings here if you introduce fake backends
+    # "fake_lima": (FakeLima, 1),
+    # "fake_manhattan": (FakeManhattan, 1),
+}
+
+# Per-worker memo of transpile results keyed on (target backend, optimization level, include_qasm,
+# digest of the built circuit's instructions).
+# Different editor payloads that build the same circuit share an entry. Values are
+# (transpiled QASM, gate count, depth) tuples rather than the mutable circuit object.
+# Each worker runs one job at a time, so no lock is needed.
+_TRANSPILED_CACHE_SIZE = 128
+_TRANSPILED_CACHE = OrderedDict()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_transpile_target(target_backend_name: str):
+    # Each worker builds a target backend once and reuses it for every job
+    backend_factory, _ = _TRANSPILE_TARGETS[target_backend_name]
+    return backend_factory()
+
+
+def _warm_worker():
+    # Pool initializer: pay the Qiskit/Aer setup cost once per worker, not on the first request
+    for target_backend_name in _TRANSPILE_TARGETS:
+        _get_transpile_target(target_backend_name)
+
+
+def _to_soa(gates: list) -> tuple[list, list, list]:
+    """
+    Splits gate dicts into parallel lists of lowercased names, qubit lists and parameter lists,
+    so the build loop below iterates plain values instead of doing dict lookups per gate.
+    """
+    names = [gate['name'].lower() for gate in gates]
+    qubit_lists = [gate.get('qubits', []) for gate in gates]
+    parameter_lists = [gate.get('parameters', []) for gate in gates]
+    return names, qubit_lists, parameter_lists
+
+
+def build_qiskit_circuit(circuit_data: dict, num_qubits: int, strict: bool = False) -> QuantumCircuit:
+    """
+    Converts frontend circuit data ({"gates": [{"name", "qubits", "parameters"}, ...]})
+    into a Qiskit QuantumCircuit. Invalid or unsupported gates are skipped with a warning,
+    or raise ValueError with strict=True (used by run_ibm, so a QPU never runs a partial circuit).
+    Used by the transpile endpoint and run_ibm. Recently built circuits are cached on the
+    canonical JSON of their gates; callers get a copy they are free to modify.
+    """
+    canonical_gates = json.dumps(circuit_data.get('gates', []), sort_keys=True)
+    return _build_qiskit_circuit_cached(canonical_gates, num_qubits, strict).copy()
+
+
+def _reject_gate(message: str, strict: bool):
+    # Invalid gates raise in strict mode and are skipped with a warning otherwise
+    if strict:
+        raise ValueError(message)
+    print(f"Warning: {message}. Skipping.")
+
+
+@functools.lru_cache(maxsize=64)
+def _build_qiskit_circuit_cached(canonical_gates: str, num_qubits: int, strict: bool) -> QuantumCircuit:
+    names, qubit_lists, parameter_lists = _to_soa(json.loads(canonical_gates))
+
+    # Initialize with qubits, and with classical bits for measurement (num_qubits for classical bits)
+    # only if the circuit measures; the register is sized once here, never grown while building
+    qiskit_circuit = QuantumCircuit(num_qubits, num_qubits if 'measure' in names else 0)
+    circuit_qubits = qiskit_circuit.qubits
+    for gate_name, qubits, parameters in zip(names, qubit_lists, parameter_lists):
+        # Ensure qubits are valid indices before applying
+        if not qubits or any(type(q) is not int or not 0 <= q < num_qubits for q in qubits):
+            _reject_gate(f"Invalid qubit index for gate '{gate_name}': {qubits}", strict)
+            continue
+
+        if gate_name == 'measure':
+            # Measure qubit[0] into classical bit[0] (assuming 1-to-1 mapping for simplicity)
+            qiskit_circuit.measure(qubits[0], qubits[0])
+            continue
+
+        gate_spec = _TRANSPILE_GATE_DISPATCH.get(gate_name)
+        if gate_spec is None:
+            _reject_gate(f"Unsupported gate type encountered during Qiskit conversion: {gate_name}", strict)
+            continue
+
+        gate_class, gate_num_qubits, gate_num_params = gate_spec
+        if gate_num_qubits > 1 and (len(qubits) != gate_num_qubits or len(set(qubits)) != gate_num_qubits):
+            # Multi-qubit gates need exactly their number of distinct qubits
+            _reject_gate(f"Gate '{gate_name}' needs {gate_num_qubits} distinct qubits, got {qubits}", strict)
+            continue
+        if len(parameters) < gate_num_params:
+            _reject_gate(f"Gate '{gate_name}' needs {gate_num_params} parameter(s), got {parameters}", strict)
+            continue
+        # Append the instruction directly; the indices were validated above
+        qiskit_circuit._append(CircuitInstruction(
+            gate_class(*parameters[:gate_num_params]),
+            tuple(circuit_qubits[q] for q in qubits[:gate_num_qubits]),
+        ))
+
+    return qiskit_circuit
+
+
+# Synthesizes a 2x2 unitary into a single U gate (plus global phase)
+_EULER_U = OneQubitEulerDecomposer(basis='U')
+
+
+def _fuse_single_qubit_runs(qiskit_circuit: QuantumCircuit) -> QuantumCircuit:
+    """
+    Returns a copy of the circuit in which every run of two or more adjacent single-qubit gates
+    on a wire is multiplied into one U gate, so transpile() starts from a smaller DAG.
+    """
+    fused = qiskit_circuit.copy_empty_like()
+    pending = {} # qubit -> single-qubit gate instructions not yet written to the fused circuit
+
+    def flush(qubit):
+        run = pending.pop(qubit, None)
+        if not run:
+            return
+        if len(run) == 1:
+            fused.append(run[0])
+            return
+        matrix = np.eye(2, dtype=complex)
+        for instruction in run:
+            matrix = instruction.operation.to_matrix() @ matrix
+        fused.compose(_EULER_U(matrix), [qubit], inplace=True)
+
+    for instruction in qiskit_circuit.data:
+        if isinstance(instruction.operation, Gate) and len(instruction.qubits) == 1 and not instruction.clbits:
+            pending.setdefault(instruction.qubits[0], []).append(instruction)
+            continue
+        # Multi-qubit gates and measurements end the runs on the wires they touch
+        for qubit in instruction.qubits:
+            flush(qubit)
+        fused.append(instruction)
+    for qubit in list(pending):
+        flush(qubit)
+    return fused
+
+
+def _circuit_digest(qiskit_circuit: QuantumCircuit) -> bytes:
+    # Hashes (gate name, parameters, qubit/clbit indices) per instruction instead of
+    # serializing the circuit to QASM just to compute a cache key
+    qubit_index = {qubit: i for i, qubit in enumerate(qiskit_circuit.qubits)}
+    clbit_index = {clbit: i for i, clbit in enumerate(qiskit_circuit.clbits)}
+    canonical = [qiskit_circuit.num_qubits] + [
+        (instruction.operation.name, tuple(instruction.operation.params),
+         tuple(qubit_index[q] for q in instruction.qubits), tuple(clbit_index[c] for c in instruction.clbits))
+        for instruction in qiskit_circuit.data
+    ]
+    return hashlib.blake2b(repr(canonical).encode(), digest_size=16).digest()
+
+
+def transpile_for_backend(circuit_data: dict, target_backend_name: str, num_qubits: int,
+                          optimization_level: int = None, include_qasm: bool = True,
+                          full_optimization: bool = False) -> tuple[dict, int]:
+    """
+    Builds and transpiles a circuit for the named target backend.
+    optimization_level (0-3) defaults to 3 with full_optimization, otherwise to the target's entry
+    in _TRANSPILE_TARGETS. When no level applies and the target has no coupling map, the circuit
+    is only fused, not transpiled.
+    With include_qasm=False the transpiled circuit is not serialized and only metrics are returned.
+
+    Returns:
+        tuple: (response payload dict, HTTP status code)
+    """
+    if target_backend_name not in _TRANSPILE_TARGETS:
+        return {"error": f"Unsupported target backend for transpilation: {target_backend_name}"}, 400
+    if optimization_level is None:
+        _, optimization_level = _TRANSPILE_TARGETS[target_backend_name]
+        if full_optimization:
+            optimization_level = 3
+
+    qiskit_circuit = build_qiskit_circuit(circuit_data, num_qubits)
+
+    cache_key = (target_backend_name, optimization_level, include_qasm, _circuit_digest(qiskit_circuit))
+    cached = _TRANSPILED_CACHE.get(cache_key)
+    if cached is not None:
+        _TRANSPILED_CACHE.move_to_end(cache_key)
+    else:
+        target_backend = _get_transpile_target(target_backend_name)
+        transpiled_circuit = _fuse_single_qubit_runs(qiskit_circuit)
+        if optimization_level is not None or target_backend.configuration().coupling_map is not None:
+            # optimization_level: 0 (no optimization) to 3 (heavy optimization)
+            transpiled_circuit = transpile(transpiled_circuit, target_backend,
+                                           optimization_level=optimization_level if optimization_level is not None else 1)
+        transpiled_qasm = qasm2.dumps(transpiled_circuit) if include_qasm else None
+        cached = (transpiled_qasm, transpiled_circuit.size(), transpiled_circuit.depth())
+        _TRANSPILED_CACHE[cache_key] = cached
+        if len(_TRANSPILED_CACHE) > _TRANSPILED_CACHE_SIZE:
+            _TRANSPILED_CACHE.popitem(last=False)
+    transpiled_qasm, transpiled_gate_count, transpiled_depth = cached
+
+    return {
+        "transpiled_circuit_qasm": transpiled_qasm, # QASM string of the transpiled circuit, or None if not requested
+        "original_gate_count": qiskit_circuit.size(),
+        "transpiled_gate_count": transpiled_gate_count,
+        "original_depth": qiskit_circuit.depth(),
+        "transpiled_depth": transpiled_depth,
+        "optimization_level": optimization_level, # None: unconstrained target, transpilation skipped
+        "message": "Circuit transpiled successfully!"
+    }, 200
+
+
+@functools.lru_cache(maxsize=None)
+def get_transpile_pool() -> concurrent.futures.ProcessPoolExecutor:
+    # Created on first use and kept for the process lifetime. Workers are spawned rather than
+    # forked so they do not inherit the server's threads (Aer's OpenMP pool, HTTP sessions).
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_warm_worker,
+    )
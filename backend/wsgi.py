@@ -0,0 +1,10 @@
+# wsgi.py
+# Entry point for production WSGI servers, e.g.:
+#   gunicorn -k gthread -w 1 --threads 16 -b 0.0.0.0:5000 wsgi:app
+# `python app.py` still starts the Werkzeug development server.
+from app import app, warm_backends
+
+warm_backends()
+
+if __name__ == '__main__':
+    app.run(port=5000)